@@ -30,5 +30,24 @@ prediction_threshold = 0.99
 sequence_threshold = 0.999
 num_training_rounds = 20
 mask_refinement_method = 'cone'
+concurrent_learners = True      # Whether the term learner runs in a thread while the deep learner trains
+
+# Embedding cache constants (None for unbounded)
+embedding_cache_entries = 1000000
+embedding_cache_bytes = None
+embedding_cache_slab = False
+
+# Batch production constants (passed to Keras fit/predict generators)
+data_workers = 1                # Number of workers producing batches
+use_multiprocessing = False     # Whether workers are processes (forked, sharing the embedding model) or threads
+max_queue_size = 10             # Number of batches prepared ahead of the model
+bucket_by_length = False        # Whether batches group documents of similar length (only padded to their longest)
+
+# Parse store constants (spaCy parses kept on disk, so unchanged texts aren't parsed again)
+use_parse_store = True
+parse_store_bytes = None        # Maximum size of each model's store, least recently used parses are evicted first
+
+# Context matrix constants
+context_matrix_capacity = None  # Maximum number of n-grams counted when selecting features (None for an exact selection)
 
 warn('Loaded execution params with dataset %s and fastText model %s' % (dataset, fast_text_model), RuntimeWarning)
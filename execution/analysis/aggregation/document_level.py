@@ -2,7 +2,7 @@ from utilities.data_management import make_path, load_vector, open_w_pandas, get
     output_aggregated_abusive_intent, make_dir
 from utilities.plotting import hist_plot, show, set_font_size
 from model.analysis import group_document_predictions
-from numpy import argsort, unique, flip
+from numpy import argsort, unique, flip, all, diff
 from pandas import DataFrame
 from config import dataset
 
@@ -24,11 +24,14 @@ print('Config complete.')
 contexts = open_w_pandas(context_path)
 
 not_wiki = contexts['document_index'].values >= 0
-sorted_indexes = argsort(contexts.index.values[not_wiki])
+contexts = contexts.loc[not_wiki]
+abuse = load_vector(abuse_path)[not_wiki]
+intent = load_vector(intent_path)[not_wiki]
 
-contexts = contexts.loc[not_wiki].iloc[sorted_indexes]
-abuse = load_vector(abuse_path)[not_wiki][sorted_indexes]
-intent = load_vector(intent_path)[not_wiki][sorted_indexes]
+# Contexts are stored in document order, only contexts stored shuffled (by older runs) have to be sorted back
+if not all(diff(contexts.index.values) > 0):
+    sorted_indexes = argsort(contexts.index.values)
+    contexts, abuse, intent = contexts.iloc[sorted_indexes], abuse[sorted_indexes], intent[sorted_indexes]
 print('Data loaded.')
 
 document_indexes = contexts['document_index'].values
@@ -2,10 +2,16 @@ from utilities.data_management import make_path, check_existence, open_w_pandas,
 from scipy.sparse import load_npz, save_npz
 from utilities.plotting import show, plot_line
 from numpy import asarray, cumsum, sum, sort, flip
+from numpy.random import choice
 from sklearn.feature_extraction.text import CountVectorizer
+from model.extraction import sharded_n_gram_matrix, compare_n_gram_selection
 from time import time
 from config import dataset
 
+# Number of most frequent sequences to keep, counted in bounded memory, or None for the full (unpruned) matrix
+max_sequences = None
+comparison_sample_size = 100000     # Contexts the bounded selection is compared with the exact selection on
+
 # Define paths
 base_path = make_path('data/processed_data/') / dataset / 'analysis' / 'intent'
 context_path = base_path / 'contexts.csv'
@@ -20,16 +26,29 @@ if not matrix_path.exists() or not n_grams_path.exists():
     print('Computing full sequence-context matrix')
 
     contexts = open_w_pandas(context_path)['contexts'].values
-    vectorizer = CountVectorizer(ngram_range=(3, 6), token_pattern=r'\b\w+\b')
-
     start = time()
-    document_matrix = vectorizer.fit_transform(contexts)
-    print('Completed matrix in', time() - start, 'seconds, saving.')
 
-    sequences = asarray(vectorizer.get_feature_names())
+    if max_sequences is None:
+        vectorizer = CountVectorizer(ngram_range=(3, 6), token_pattern=r'\b\w+\b')
+        document_matrix = vectorizer.fit_transform(contexts)
+        sequences = asarray(vectorizer.get_feature_names())
+    else:
+        document_matrix, sequences = sharded_n_gram_matrix(
+            contexts, ngram_range=(3, 6), num_features=max_sequences, capacity=4 * max_sequences
+        )
+    print('Completed matrix in', time() - start, 'seconds, saving.')
 
     save_npz(matrix_path, document_matrix)
     vector_to_file(sequences, n_grams_path)
+
+    if max_sequences is not None:
+        # Compare the bounded selection with the exact top sequences (counting every sequence) on a sample of contexts
+        sample = contexts[choice(len(contexts), min(comparison_sample_size, len(contexts)), replace=False)]
+        report = compare_n_gram_selection(sample, max_sequences, 4 * max_sequences, ngram_range=(3, 6))
+
+        print('Bounded selection on', len(sample), 'sampled contexts, recall of the exact top', max_sequences,
+              'sequences', report['recall'], 'error bound', report['error_bound'])
+        print('Selection report', report)
 else:
     check_existence([matrix_path, n_grams_path])
 
@@ -1,7 +1,6 @@
 from fasttext import load_model
 from utilities.data_management import make_path, check_existence, make_dir, intent_verb_filename, load_vector, \
-    get_embedding_path
-from pandas import read_csv
+    get_embedding_path, IntentFrames
 from model.analysis import get_verbs, generate_word_vectors
 from config import dataset, fast_text_model
 
@@ -11,7 +10,7 @@ base_dir = make_path('data/processed_data/') / dataset / 'analysis'
 data_dir = base_dir / 'intent'
 destination_dir = base_dir / 'embeddings'
 
-frame_info_path = data_dir / 'intent_frame.csv'
+frame_info_path = data_dir / 'intent_frame.npz'
 # english_mask = data_dir / 'english_mask.csv'
 
 desire_index = 1
@@ -22,8 +21,8 @@ make_dir(destination_dir)
 print('Config complete.')
 
 # english_mask = load_vector(english_mask).astype(bool)
-intent_frames = read_csv(frame_info_path, header=None, keep_default_na=False).values
-print('Loaded data with shape', intent_frames.shape)
+intent_frames = IntentFrames.load(frame_info_path)
+print('Loaded data with', len(intent_frames), 'frames')
 
 desire_verbs = get_verbs(intent_frames, desire_index)
 action_verbs = get_verbs(intent_frames, action_index)
@@ -0,0 +1,29 @@
+from utilities.analysis import rank_indexes
+from numpy import argsort, flip, array_equal, sort
+from numpy.random import RandomState
+from timeit import repeat
+
+# Micro-benchmark of the top-k selection used when rate limiting (full sort vs. partial selection, which only needs
+# the selected set, as deep_rate_limit does)
+num_contexts = 5000000
+num_selected = [1000, 10000, 100000, 1000000]
+num_repeats = 5
+
+random = RandomState(0)
+predictions = random.rand(num_contexts).astype('float32')
+print('Generated %d predictions.' % num_contexts)
+
+for k in num_selected:
+    # Check the selection matches the full sort it replaces (ties included)
+    expected = flip(argsort(predictions))[:k]
+    if not array_equal(rank_indexes(predictions, k, largest=True), expected):
+        raise RuntimeError('Order of the top %d predictions does not match a full sort.' % k)
+    if not array_equal(sort(rank_indexes(predictions, k, largest=True, ordered=False)), sort(expected)):
+        raise RuntimeError('Selection of the top %d predictions does not match a full sort.' % k)
+
+    sort_time = min(repeat(lambda: flip(argsort(predictions))[:k], number=1, repeat=num_repeats))
+    select_time = min(repeat(lambda: rank_indexes(predictions, k, largest=True, ordered=False), number=1,
+                             repeat=num_repeats))
+
+    print('Top %d: full sort %.4fs, partial selection %.4fs (%.1fx)' % (k, sort_time, select_time,
+                                                                       sort_time / select_time))
@@ -1,11 +1,11 @@
 if __name__ == '__main__':
     from utilities.data_management import make_path, open_w_pandas, check_existence, make_dir, save_dataframe, \
-        vector_to_file
+        vector_to_file, IntentFrames
     from model.extraction import split_into_contexts
     from model.expansion.intent_seed import tag_intent_documents
-    from utilities.pre_processing import final_clean
+    from utilities.pre_processing import final_clean, index_dtype
     from pandas import DataFrame
-    from numpy import savetxt, zeros, hstack, arange, sum, logical_not, vstack
+    from numpy import savetxt, zeros, hstack, arange, sum, logical_not, save
     from numpy.random import choice
     from time import time
     from config import dataset
@@ -19,8 +19,6 @@ if __name__ == '__main__':
     make_dir(dest_dir)
     print('Config complete, starting initial mask computation.')
 
-    empty_frame = [None, None, None, None, None, -1]
-
     raw_documents = open_w_pandas(data_path)
     raw_objective = open_w_pandas(objective_path)
 
@@ -53,18 +51,15 @@ if __name__ == '__main__':
 
     # Add negative intent values and empty frames for wikipedia contexts
     intent_values = hstack([intent_values, zeros(num_wikipedia)])
-    intent_frames = vstack([intent_frames, [empty_frame] * num_wikipedia])
+    intent_frames = IntentFrames.join([intent_frames, IntentFrames.empty(num_wikipedia)])
 
-    # Shuffle contexts, rough labels, and frames
-    shuffle_pattern = choice(num_contexts, num_contexts, replace=False)
-    document_contexts = document_contexts.iloc[shuffle_pattern]
-    intent_values = intent_values[shuffle_pattern]
-    intent_frames = intent_frames[shuffle_pattern]
-    print('Data shuffled.')
+    # Contexts, rough labels, and frames stay in document order, the shuffle is saved as a permutation for training
+    shuffle_pattern = choice(num_contexts, num_contexts, replace=False).astype(index_dtype(num_contexts))
+    save(dest_dir / 'shuffle_pattern.npy', shuffle_pattern)
+    print('Shuffle pattern saved.')
 
     # Save initial mask, context mapping, and intent frame (mask values)
-    intent_frames = DataFrame(intent_frames)
-    intent_frames.to_csv(dest_dir / 'intent_frame.csv', header=False, index=False)
+    intent_frames.save(dest_dir / 'intent_frame.npz')
     vector_to_file(intent_values, dest_dir / 'intent_mask.csv', fmt='%.1f')
     print('Saved masks, saving contexts.')
 
@@ -1,4 +1,4 @@
-from utilities.data_management import make_path, load_vector, open_w_pandas, check_existence, read_csv, \
+from utilities.data_management import make_path, load_vector, open_w_pandas, check_existence, IntentFrames, \
     intent_verb_filename
 from model.analysis import refine_rough_labels
 from numpy import asarray, logical_not, all, sum, savetxt
@@ -32,7 +32,7 @@ print('Loaded data.')
 
 rough_labels = load_vector(intent_dir / 'intent_mask.csv')
 contexts = open_w_pandas(intent_dir / 'contexts.csv')['contexts'].values
-intent_frames = read_csv(intent_dir / 'intent_frame.csv', header=None).values
+intent_frames = IntentFrames.load(intent_dir / 'intent_frame.npz')
 print('Content loaded.')
 
 max_verbs = None
@@ -40,15 +40,8 @@ desire_verb_index = 1
 action_verb_index = 2
 
 # Map terms truncated by spaCy
-desire_mods = 0
-for index, tokens in enumerate(intent_frames):
-    desire_verb = tokens[desire_verb_index]
-    action_verb = tokens[action_verb_index]
-    if desire_verb in token_mappings:
-        intent_frames[index, desire_verb_index] = token_mappings[desire_verb]
-        desire_mods += 1
-    if action_verb in token_mappings:
-        intent_frames[index, action_verb_index] = token_mappings[action_verb]
+desire_mods = intent_frames.map_verbs('desire', token_mappings)
+intent_frames.map_verbs('action', token_mappings)
 
 print('desire mods', desire_mods)
 
@@ -99,7 +92,7 @@ print('cone didnt keep', set(desire[:, 0]) - set(cone_desire_tokens))
 
 print('Cone vs cube', set(cone_desire_tokens) - set(cube_desire_tokens))
 
-# print(contexts[intent_frames[:, 1] == 'estimated'])
+# print(contexts[intent_frames.contains_verb('desire', ['estimated'])])
 
 hist_plot(distances, 'Histogram of distances to central desire vector')
 
@@ -48,7 +48,6 @@ pre_processes = [
 ]
 
 if __name__ == '__main__':
-    runs = [False, True]
     expand_csv_row_size()
 
     # Generate path
@@ -98,31 +97,34 @@ if __name__ == '__main__':
         set_name = data_set['data_set']
         check_existence(source_directory / set_name / (set_name + '.csv'))
 
-    # Pre process datasets
-    for run_partial_process in runs:
-        run_name = 'partial' if run_partial_process else 'pre'
-        print('\nRunning', run_name, 'process.')
+    # Pre process datasets, each dataset is read once and written with both the pre and partial processes
+    runs = {
+        '': pre_processes,
+        '_partial': partial_processes
+    }
+    options = {
+        # 'max_documents': 10000,
+        'encoding': 'latin-1',
+        'chunk_size': 100000,
+        'resumable': True
+    }
 
-        processes = partial_processes if run_partial_process else pre_processes
-
-        modified_header = generate_header(processes)
-
-        options = {
-            # 'max_documents': 10000,
-            'encoding': 'latin-1'
-        }
+    for data_set in data_sets:
+        set_name = data_set['data_set']
+        source_path = source_directory / set_name / (set_name + '.csv')
 
-        for data_set in data_sets:
-            set_name = data_set['data_set']
-            mod = '_partial' if run_partial_process else ''
-            source_path = source_directory / set_name / (set_name + '.csv')
-            dest_path = dest_directory / (set_name + mod + '.csv')
+        # Resumable runs only write the destination once all chunks are complete
+        mods = [mod for mod in runs if not (dest_directory / (set_name + mod + '.csv')).exists()]
+        if len(mods) == 0:
+            print('Skipping', set_name)
+            continue
 
-            if dest_path.exists():
-                print('Skipping', set_name, mod)
-                continue
+        print('\nRunning', set_name, 'with', ', '.join('partial' if mod else 'pre' for mod in mods), 'processes.')
+        dest_paths = [dest_directory / (set_name + mod + '.csv') for mod in mods]
+        branches = [runs[mod] for mod in mods]
+        modified_headers = [generate_header(processes) for processes in branches]
 
-            process_documents(source_path, dest_path, processes, data_set['accessor'],
-                              data_set['mutator'], modified_header, options)
+        process_branched_documents(source_path, dest_paths, branches, data_set['accessor'], data_set['mutator'],
+                                   modified_headers, options)
 
-            print(set_name, 'done.')
+        print(set_name, 'done.')
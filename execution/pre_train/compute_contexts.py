@@ -1,9 +1,11 @@
-from utilities.data_management import make_path, make_dir, open_w_pandas, check_existence, save_dataframe
-from model.extraction import split_into_contexts
-from pandas import DataFrame
+from utilities.data_management import make_path, make_dir, check_existence
+from model.extraction import iterate_contexts, write_contexts
+from pandas import read_csv
+from itertools import chain
 from utilities.pre_processing import final_clean
 from config import dataset
 
+chunk_size = 100000
 data_path = make_path('data/prepared_data') / (dataset + '_partial.csv')
 context_path = make_path('data/processed_data') / dataset / 'analysis' / 'intent' / 'contexts.csv'
 
@@ -11,18 +13,11 @@ check_existence([data_path])
 make_dir(context_path, max_levels=3)
 print('Config complete.')
 
-raw_documents = open_w_pandas(data_path)
-documents = raw_documents['document_content'].values
-print('Loaded data')
+# Read documents in chunks and stream their contexts straight to disk
+chunks = read_csv(data_path, index_col=0, chunksize=chunk_size)
+contexts = chain.from_iterable(
+    iterate_contexts(chunk['document_content'].values, chunk.index.values) for chunk in chunks
+)
 
-document_contexts, (document_indexes, context_indexes) = split_into_contexts(documents, raw_documents.index.values)
-print('Contexts extracted, expanded', len(documents), 'to', len(document_contexts))
-
-document_contexts = DataFrame(list(map(final_clean, document_contexts)), columns=['contexts'])
-document_contexts['document_index'] = document_indexes
-document_contexts['context_index'] = context_indexes
-print('Assembled processed data.')
-
-# Save contexts
-save_dataframe(document_contexts, context_path)
-print('Contexts saved.')
+num_contexts = write_contexts(context_path, contexts, clean=final_clean)
+print('Contexts extracted and saved,', num_contexts, 'contexts.')
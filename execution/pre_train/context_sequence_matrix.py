@@ -1,10 +1,12 @@
-from sklearn.feature_extraction.text import CountVectorizer
+from model.extraction import sharded_n_gram_matrix
 from utilities.data_management import make_path, open_w_pandas, vector_to_file
 from scipy.sparse import save_npz
-from numpy import asarray
 from time import time
 from config import dataset
 
+# Maximum number of n-grams counted per process, set to bound memory (selection becomes approximate) or None for exact
+capacity = None
+
 # Define paths
 base = make_path('data/processed_data/') / dataset / 'analysis' / 'intent'
 source = base / 'contexts.csv'
@@ -15,15 +17,10 @@ feature_path = base / 'ngrams.csv'
 contexts = open_w_pandas(source)['contexts'].values.astype(str)
 print('Data loaded')
 
-# Initialize vectorizer
-vectorizer = CountVectorizer(ngram_range=(3, 6), max_features=500000, token_pattern=r'\b\w+\b')
-
-# Compute context-term matrix
+# Compute context-term matrix (sharded across processes)
 start = time()
-document_matrix = vectorizer.fit_transform(contexts)
-print('Computed working sequence matrix in', start - time(), 'seconds')
-
-sequences = asarray(vectorizer.get_feature_names())
+document_matrix, sequences = sharded_n_gram_matrix(contexts, ngram_range=(3, 6), num_features=500000, capacity=capacity)
+print('Computed working sequence matrix in', time() - start, 'seconds')
 print('Context ngram matrix computed, saving')
 
 # Save data
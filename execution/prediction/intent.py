@@ -1,11 +1,12 @@
 from model.networks import generate_intent_network
 from utilities.data_management import make_path, check_existence, get_embedding_path, get_model_path, open_w_pandas, \
-    make_dir, vector_to_file, get_prediction_path
+    make_dir, vector_to_file, get_prediction_path, deduplicate
 from utilities.data_management.model_management import load_model_weights
 from utilities.pre_processing import runtime_clean
 from fasttext import load_model
 from model.layers.realtime_embedding import RealtimeEmbedding
-from config import dataset, max_tokens, embedding_dimension, execute_verbosity
+from config import dataset, max_tokens, embedding_dimension, execute_verbosity, data_workers, use_multiprocessing, \
+    max_queue_size, bucket_by_length
 
 prediction_path = get_prediction_path('intent')
 contexts_path = make_path('data/processed_data') / dataset / 'analysis' / 'intent' / 'contexts.csv'
@@ -18,16 +19,18 @@ make_dir(prediction_path)
 print('Config complete.')
 
 # Generate model and load weights
-model = generate_intent_network(max_tokens, embedding_dimension=embedding_dimension)
+model = generate_intent_network(max_tokens, embedding_dimension=embedding_dimension, variable_length=bucket_by_length)
 load_model_weights(model, weights_path)
 print('Model loaded.')
 
-# Load data and embedding model
-data_source = runtime_clean(open_w_pandas(contexts_path)['contexts'].values)
+# Load data and embedding model, duplicate contexts are only predicted once
+data_source, inverse = deduplicate(runtime_clean(open_w_pandas(contexts_path)['contexts'].values), 'contexts')
 embeddings = load_model(str(embeddings_path))
-embedded_data = RealtimeEmbedding(embeddings, data_source, uniform_weights=True)
+embedded_data = RealtimeEmbedding(embeddings, data_source, uniform_weights=True, bucket=bucket_by_length)
 print('Data loaded.')
 
-predictions = model.predict_generator(embedded_data, verbose=execute_verbosity)
+predictions = model.predict_generator(embedded_data, verbose=execute_verbosity, workers=data_workers,
+                                      use_multiprocessing=use_multiprocessing, max_queue_size=max_queue_size)
+predictions = embedded_data.restore_order(predictions)[inverse]
 vector_to_file(predictions, prediction_path)
 print('Predictions saved.')
@@ -5,7 +5,8 @@ from fasttext import load_model
 from model.layers.realtime_embedding import RealtimeEmbedding
 from keras.callbacks import EarlyStopping
 from pandas import DataFrame
-from config import dataset, max_tokens, training_verbosity, batch_size
+from config import dataset, max_tokens, training_verbosity, batch_size, data_workers, use_multiprocessing, \
+    max_queue_size, bucket_by_length
 from time import time
 
 
@@ -32,21 +33,26 @@ print('Loaded data.')
 training_data, testing_data, training_labels, testing_labels = split_sets(documents, labels=labels)
 
 # Generate model
-training = RealtimeEmbedding(embedding_model, training_data, training_labels, uniform_weights=True)
+training = RealtimeEmbedding(embedding_model, training_data, training_labels, uniform_weights=True,
+                             bucket=bucket_by_length)
 training.set_usage_mode(True)
 
-testing = RealtimeEmbedding(embedding_model, testing_data, testing_labels, uniform_weights=True)
+testing = RealtimeEmbedding(embedding_model, testing_data, testing_labels, uniform_weights=True,
+                            bucket=bucket_by_length)
 testing.set_usage_mode(True)
 
 
-model = generate_abuse_network(max_tokens, embedding_dimension=training.embedding_dimension)
+model = generate_abuse_network(
+    max_tokens, embedding_dimension=training.embedding_dimension, variable_length=bucket_by_length
+)
 print('Generated model\n', model.summary())
 
 start = time()
 
 stopping_conditions = EarlyStopping(monitor='val_loss', patience=3, verbose=1, restore_best_weights=True)
 history = model.fit_generator(training, epochs=50, verbose=training_verbosity, callbacks=[stopping_conditions],
-                              validation_data=testing, shuffle=True).history
+                              validation_data=testing, shuffle=True, workers=data_workers,
+                              use_multiprocessing=use_multiprocessing, max_queue_size=max_queue_size).history
 
 training_time = time() - start
 print('Completed training in', training_time, 's')
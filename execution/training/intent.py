@@ -1,14 +1,15 @@
 from model.networks import generate_intent_network, generate_tree_sequence_network, load_model_weights
 from utilities.data_management import make_dir, make_path, open_w_pandas, check_existence, \
-    get_model_path, load_vector, vector_to_file, get_embedding_path, get_input, get_latest_model
+    get_model_path, load_vector, vector_to_file, get_embedding_path, get_input, get_latest_model, SequenceMatrix
 from utilities.pre_processing import runtime_clean
 from model.training import train_sequence_learner, train_deep_learner, get_consensus, reinforce_xgboost, deep_history, \
-    save_sequence_history, save_deep_history
-from config import dataset, max_tokens, mask_refinement_method, num_training_rounds
+    save_sequence_history, save_deep_history, run_learners
+from config import dataset, max_tokens, mask_refinement_method, num_training_rounds, bucket_by_length, \
+    concurrent_learners
 from scipy.sparse import load_npz
 from fasttext import load_model
 from model.layers.realtime_embedding import RealtimeEmbedding
-from numpy import sum
+from numpy import sum, load
 from time import time
 
 
@@ -22,6 +23,8 @@ intent_path = base_path / 'intent'
 context_path = intent_path / 'contexts.csv'
 initial_label_path = intent_path / (mask_refinement_method + '_mask.csv')
 document_matrix_path = intent_path / 'document_matrix.npz'
+shuffle_path = intent_path / 'shuffle_pattern.npy'
+vocabulary_path = intent_path / 'embedding_vocabulary.npz'
 label_path = intent_path / 'intent_training_labels.csv'
 token_path = intent_path / 'ngrams.csv'
 midway_mask_generator = lambda info: intent_path / ('midway_mask_' + str(info[0]) + '_of_' + str(info[1]) + '.csv')
@@ -39,16 +42,20 @@ embedding_model = load_model(str(embedding_path))
 
 raw_contexts = open_w_pandas(context_path)['contexts'].values
 initial_labels = load_vector(initial_label_path)
-document_matrix = load_npz(document_matrix_path)
+document_matrix = SequenceMatrix(load_npz(document_matrix_path))
 tokens = load_vector(token_path)
+shuffle_pattern = load(shuffle_path) if shuffle_path.exists() else None
 print('Loaded data.')
 
 # Clean contexts and enumerate tokens
 contexts = runtime_clean(raw_contexts)
 print('Prepared data')
 
-realtime = RealtimeEmbedding(embedding_model, contexts)
-deep_model = generate_intent_network(max_tokens, embedding_dimension=realtime.embedding_dimension)
+realtime = RealtimeEmbedding(embedding_model, contexts, precompute=True, bucket=bucket_by_length,
+                             shuffle_order=shuffle_pattern, vocabulary_path=vocabulary_path)
+deep_model = generate_intent_network(
+    max_tokens, embedding_dimension=realtime.embedding_dimension, variable_length=bucket_by_length
+)
 # tree_model = generate_tree_sequence_network()
 print('Generated model\n', deep_model.summary())
 
@@ -72,15 +79,15 @@ start_time = time()
 for round_num in range(resume_round, num_training_rounds):
     print('Starting full round', round_num + 1, 'of', num_training_rounds)
 
-    # Run term learner
-    token_labels = train_sequence_learner(labels, tokens, document_matrix)
+    # Run term learner (on a copy of the labels, the deep learner updates them in place) while training deep model
+    token_labels, deep_labels = run_learners([
+        ('Term learner', train_sequence_learner, (labels.copy(), tokens, document_matrix)),
+        ('Deep learner', train_deep_learner, (deep_model, labels, realtime)),
+    ], concurrent=concurrent_learners)
 
     # Run tree sequence learner
     # tree_labels = reinforce_xgboost(tree_model, document_matrix, labels, initial_labels, features=tokens)
 
-    # Train deep model
-    deep_labels = train_deep_learner(deep_model, labels, realtime)
-
     # Count number of documents identified by term learner
     new_labels = get_consensus(labels, deep_labels, token_labels)
 
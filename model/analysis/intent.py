@@ -1,5 +1,6 @@
 from numpy import ndarray, vectorize, histogram, cumsum, argmin, sqrt, asarray, all
 from empath import Empath
+from utilities.data_management.intent_frames import IntentFrames, frame_columns
 
 
 sample_categories = ['kill', 'leisure', 'exercise', 'communication']
@@ -94,10 +95,18 @@ def get_verbs(raw_frames, column_index, unique=True):
     """
     Extracts the verbs from an intent frame matrix
 
-    :param ndarray raw_frames: Array containing intent frames
+    :param raw_frames: Array (or IntentFrames) containing intent frames
     :param int column_index: Index of verb column
     :param bool unique: Whether to return verbs or unique verbs
     """
+    if isinstance(raw_frames, IntentFrames):
+        column = frame_columns[column_index]
+        if unique:
+            return raw_frames.verb_counts(column)[0].tolist()
+
+        verbs = raw_frames.verb_column(column)
+        return verbs[raw_frames.verbs[column][0] >= 0]
+
     raw_verbs = raw_frames[:, column_index]     # Get verbs
     verbs = raw_verbs[raw_verbs != '']          # Remove zero length verbs, if present
 
@@ -142,12 +151,19 @@ def refine_rough_labels(rough_labels, refined_tokens, document_tokens, token_ind
 
     :param ndarray rough_labels: Array of rough labels
     :param list refined_tokens: List of refined tokens (that indicate *strong* intent)
-    :param ndarray document_tokens: Array of tokens for each document
+    :param document_tokens: Array of tokens (or IntentFrames) for each document
     :param int token_index: Index of tokens within document_tokens array [optional]
     :return ndarray: Refined rough labels
     """
     refined_tokens = set(refined_tokens).copy()     # Compute set of unique tokens
 
+    # Intent frames compare verb codes rather than strings
+    if isinstance(document_tokens, IntentFrames):
+        correction_mask = ~document_tokens.contains_verb(frame_columns[token_index], refined_tokens)
+        refined_labels = rough_labels.copy()
+        refined_labels[all([correction_mask, refined_labels == 1], axis=0)] = .5
+        return refined_labels
+
     # If token index is present, use to select column from document tokens array
     if token_index is not None:
         document_tokens = document_tokens[:, token_index]
@@ -1,10 +1,16 @@
 from spacy import load
-from numpy import asarray, squeeze, logical_not, add, percentile, sum
-from itertools import compress
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc
+from spacy.symbols import POS, PART
+from numpy import asarray, squeeze, logical_not, add, percentile, sum, array, uint64
+from numpy.random import choice
+from itertools import compress, islice
 from multiprocessing import Pool
 from model.extraction import generate_context_matrix
+from utilities.data_management.parse_store import ParseStore, store_directory, read_documents, write_shard
+from utilities.data_management import deduplicate, IntentFrames
 from collections.abc import Iterable
-from config import n_threads
+from config import n_threads, use_parse_store, parse_store_bytes, context_matrix_capacity
 
 # Token and dependency sets for detecting basic intent
 desire_verb_tags = {'VB', 'VBG', 'VBP', 'VBZ'}
@@ -23,6 +29,18 @@ timing_relations = {'nmod', 'compound'}
 question_tags = {'WRB', 'WP'}
 question_indicators = {'if', 'do'}
 
+# Pipeline components the intent rule doesn't use (it only reads tags, parts of speech, and dependencies)
+model_name = 'en_core_web_sm'
+unused_components = ['ner']
+dependency_components = ['parser']  # Only run on contexts that pass the screen (see intent_auxiliaries)
+intent_data_size = 7            # Intent value and frame fields returned by identify_basic_intent
+tagging_batch_size = 1000       # Contexts parsed together by spaCy
+tagging_chunk_size = 20000      # Contexts sent to a worker at a time
+
+parser = None
+intent_matchers = None
+parse_directory = None      # Directory of the parse store workers read from and write to (None to always parse)
+
 
 def assemble_related_information(base, base_dependency, information_dependency):
     potentials = list(filter(lambda _token: _token.dep_ in base_dependency, base.children))
@@ -41,6 +59,7 @@ def identify_basic_intent(context, index=-1):
     Specifically, two forms are checked for, those being will and going-to.
     Will forms of intent would be a statement such as "I will X"
     Going-to forms of intent would be statements such as "I am going to X"
+    NOTE: Contexts are tagged with its matcher equivalent (match_basic_intent), any change must be made to both
     """
     if isinstance(context, str):
         context = parser(context)
@@ -135,28 +154,311 @@ def identify_basic_intent(context, index=-1):
     return intent_score, source, desire_verb, action_verb, target, timing, index
 
 
+def build_intent_matchers(vocab):
+    """
+    Matchers for the auxiliaries that can start an intent check, particles (matched on their part of speech) and
+    special auxiliaries (matched on their text, only verbs are kept)
+    NOTE: Phrase matchers compare token attributes without creating Python tokens, unlike token patterns (Matcher)
+    """
+    particle_matcher = PhraseMatcher(vocab, attr='POS')
+    particle_matcher.add('particle', [Doc(vocab, words=['to']).from_array([POS], array([[PART]], dtype=uint64))])
+
+    auxiliary_matcher = PhraseMatcher(vocab)
+    auxiliary_matcher.add('auxiliary', [Doc(vocab, words=[auxiliary]) for auxiliary in sorted(special_auxiliaries)])
+
+    return particle_matcher, auxiliary_matcher
+
+
+def intent_auxiliaries(document):
+    """
+    Positions of the auxiliaries the intent matcher finds in a tagged (or parsed) context.
+    The rule only looks past a verb's auxiliaries when the first is a particle or a special auxiliary verb, without
+    either every verb is skipped before its dependencies are read, so the frame (the last verb, if the context ends with
+    one) is the same with or without the parse.
+    """
+    if len(document) == 0:
+        return []
+
+    particle_matcher, auxiliary_matcher = intent_matchers
+    particles = [start for _, start, _ in particle_matcher(document)]
+    auxiliaries = [start for _, start, _ in auxiliary_matcher(document) if document[start].pos_ == 'VERB']
+
+    return sorted(particles + auxiliaries)
+
+
+def intent_candidates(document, auxiliaries):
+    """ Verbs whose first auxiliary is one of the matched auxiliaries (with the auxiliary), in document order """
+    candidates = []
+    for position in auxiliaries:
+        auxiliary = document[position]
+        verb = auxiliary.head
+        if auxiliary.dep_ != 'aux' or verb.pos_ != 'VERB':
+            continue
+
+        first_auxiliary = next(child for child in verb.children if child.dep_ == 'aux')
+        if first_auxiliary.i == auxiliary.i:
+            candidates.append((verb, auxiliary))
+
+    return sorted(candidates, key=lambda candidate: candidate[0].i)
+
+
+def match_basic_intent(context, index=-1, auxiliaries=None):
+    """
+    Equivalent of identify_basic_intent (same score and frame) where the intent matcher finds the verbs that can be
+    checked for intent, so only those verbs (rather than every token) go through the pronoun, tense, negation and
+    question checks in Python
+
+    :param context: Parsed context (or text to parse)
+    :param int index: Index returned with the intent data
+    :param list auxiliaries: Positions of the context's matched auxiliaries if already found (see intent_auxiliaries)
+    """
+    if isinstance(context, str):
+        context = parser(context)
+    if not isinstance(context, Iterable):
+        context = []
+    if auxiliaries is None:
+        auxiliaries = intent_auxiliaries(context)
+
+    source, target, timing, desire_verb, action_verb, short_desire = None, None, None, None, None, None
+    intent_score = .5
+
+    candidates = intent_candidates(context, auxiliaries)
+    for action_verb, auxiliary in candidates:
+        if intent_score == .5:
+            source, target, timing, desire_verb, short_desire = None, None, None, None, None
+
+        if auxiliary.pos_ == 'VERB':                                                    # Short case
+            desire_verb = action_verb
+            short_desire = auxiliary
+
+            if short_desire.tag_ != 'MD': continue
+        else:                                                                           # Long case
+            if action_verb.head.pos_ != 'VERB': continue
+            desire_verb = action_verb.head
+
+        # Check for (first person) pronouns
+        pronouns = [child for child in desire_verb.children if child.pos_ == 'PRON' and child.i < desire_verb.i]
+        if len(pronouns) < 1: continue
+
+        source = pronouns[0].text
+        if not any(pronoun.text in first_person_pronouns for pronoun in pronouns):
+            intent_score = 0
+            continue
+
+        # Check tense of desire verb
+        if desire_verb.tag_ not in desire_verb_tags:
+            intent_score = 0
+            continue
+
+        # Get action target and timing
+        target = assemble_related_information(action_verb, target_dependencies, target_relations)
+        timing = assemble_related_information(action_verb, timing_dependencies, timing_relations)
+
+        # Check for non active desire, negations, or questions
+        negations = sum([child.dep_ == 'neg' and child.i < desire_verb.i for child in desire_verb.children])
+        questions = sum([
+            child.tag_ in question_tags or child.text in question_indicators for child in desire_verb.children
+        ])
+        if desire_verb.tag_ in non_active_desire_tags or negations % 2 != 0 or questions > 0:
+            intent_score = 0
+            continue
+
+        # Contains positive intent
+        intent_score = 1
+        break
+
+    last_verb = context[-1] if len(context) > 0 and context[-1].pos_ == 'VERB' else None
+    if intent_score == .5:
+        # Every token resets the frame while intent is undecided, so only the last token (if a verb) is kept
+        action_verb = last_verb
+        if last_verb is None or len(candidates) == 0 or candidates[-1][0].i != last_verb.i:
+            desire_verb, short_desire = None, None
+    elif intent_score == 0:
+        # Once intent is ruled out, every later verb (i.e. the last verb) is taken as the action verb
+        action_verb = next(token for token in reversed(context) if token.pos_ == 'VERB')
+
+    # If short case, move desire verb for export
+    if short_desire is not None:
+        desire_verb = short_desire
+
+    desire_verb = desire_verb.text if desire_verb is not None else None
+    action_verb = action_verb.text if action_verb is not None else None
+
+    if desire_verb is not None and desire_verb in special_transforms:
+        desire_verb = special_transforms[desire_verb]
+
+    return intent_score, source, desire_verb, action_verb, target, timing, index
+
+
+def load_parser():
+    """ Loads the spaCy pipeline used to tag intent, without the components the rule doesn't use """
+    return load(model_name, disable=unused_components)
+
+
 def worker_init(*props):
-    """ Initialization function for Pool workers """
-    global parser
-    parser = load('en_core_web_sm')
+    """ Initialization function for Pool workers, takes the directory of the parse store (if there is one) """
+    global parser, intent_matchers, parse_directory
+    parser = load_parser()
+    intent_matchers = build_intent_matchers(parser.vocab)
+    parse_directory = props[0] if len(props) > 0 else None
 
 
-def tag_intent_documents(contexts):
-    """ Determines whether each context contains intent, then return intent value and base verb """
-    # Initialize worker pool
-    worker_pool = Pool(n_threads, initializer=worker_init)
+def pipe_components(documents, dependencies, batch_size=tagging_batch_size):
+    """
+    Runs tokenized documents through the parser's pipeline components (i.e. the equivalent of pipe)
 
-    # Process documents
-    intent_data = worker_pool.map(identify_basic_intent, contexts)
+    :param documents: Tokenized documents
+    :param bool dependencies: Whether to run the dependency components, rather than every other component
+    :param int batch_size: Number of documents processed together
+    """
+    for name, component in parser.pipeline:
+        if (name in dependency_components) != dependencies:
+            continue
+        documents = component.pipe(documents, batch_size=batch_size) if hasattr(component, 'pipe') else \
+            map(component, documents)
+    return documents
+
+
+def context_texts(contexts):
+    """ Text parsed for each context (missing contexts are parsed as empty) """
+    return [context if isinstance(context, str) else '' for context in contexts]
+
+
+def tag_intent_batch(contexts, batch_size=tagging_batch_size, screen=True, locations=None):
+    """
+    Streams a batch of contexts through the parser and identifies the intent of each (see match_basic_intent).
+    Contexts are tagged first, only those with a matched auxiliary (see intent_auxiliaries) are dependency parsed.
+
+    :param list contexts: Contexts to tag
+    :param int batch_size: Number of contexts parsed together by spaCy
+    :param bool screen: Whether to skip the dependency parse of contexts that fail the screen, (default True)
+    :param list locations: Location of each context's parse in the parse store (see ParseStore.locate), (default None)
+    :return tuple[list, int, str]: Intent data of each context, number of contexts that weren't dependency parsed,
+        and the parse store shard of the new parses (None if the store isn't used)
+    """
+    use_store = locations is not None and parse_directory is not None
+    if not use_store:
+        locations = [None] * len(contexts)
+
+    # Stored parses are loaded, the rest are tagged and then parsed if they pass the screen
+    stored = [location for location in locations if location is not None]
+    stored = iter(read_documents(parse_directory, stored, parser.vocab) if len(stored) > 0 else [])
+
+    texts = [text for text, location in zip(context_texts(contexts), locations) if location is None]
+    tagged = list(pipe_components((parser.make_doc(text) for text in texts), False, batch_size))
+    auxiliaries = [intent_auxiliaries(document) for document in tagged]
+    is_candidate = [not screen or len(document_auxiliaries) > 0 for document_auxiliaries in auxiliaries]
+    parsed = list(pipe_components(compress(tagged, is_candidate), True, batch_size))
+
+    shard = write_shard(parse_directory, parsed) if use_store and len(parsed) > 0 else None
+
+    # The parse doesn't change the tags, so the auxiliaries matched before it are reused
+    parsed_iter = iter(parsed)
+    new = iter([
+        (next(parsed_iter) if candidate else document, document_auxiliaries)
+        for document, document_auxiliaries, candidate in zip(tagged, auxiliaries, is_candidate)
+    ])
+    intent_data = []
+    for location in locations:
+        if location is not None:
+            intent_data.append(match_basic_intent(next(stored)))
+        else:
+            document, document_auxiliaries = next(new)
+            intent_data.append(match_basic_intent(document, auxiliaries=document_auxiliaries))
+
+    return intent_data, len(is_candidate) - sum(is_candidate), shard
+
+
+def tag_intent_chunk(package):
+    """ Tags a chunk of contexts along with the locations of their stored parses (for Pool workers) """
+    contexts, locations = package
+    return tag_intent_batch(contexts, locations=locations)
+
+
+def verify_intent_tagging(contexts, sample_size):
+    """
+    Checks that the screened tagging (see tag_intent_batch) gives the same intent score and frame as fully parsing the
+    contexts and applying identify_basic_intent, for a random sample of contexts
+
+    :param list contexts: Contexts to sample from
+    :param int sample_size: Number of contexts to check
+    :return int: Number of sampled contexts that weren't dependency parsed
+    """
+    if parser is None:
+        worker_init()
 
-    # Close pool
+    sample = [contexts[index] for index in choice(len(contexts), min(sample_size, len(contexts)), replace=False)]
+    screened, num_skipped, _ = tag_intent_batch(sample)
+    reference = [identify_basic_intent(document) for document in parser.pipe(context_texts(sample))]
+
+    mismatches = [context for context, data, expected in zip(sample, screened, reference) if data != expected]
+    print('Verification,', num_skipped, 'of', len(sample), 'sampled contexts weren\'t dependency parsed,',
+          len(mismatches), 'changed intent')
+    if len(mismatches) > 0:
+        raise ValueError('Screened intent differs from the full parse for %d sampled contexts, ex. %r' % (
+            len(mismatches), mismatches[0]))
+
+    return num_skipped
+
+
+def chunk_contexts(contexts, chunk_size=tagging_chunk_size):
+    """ Splits contexts into lists of (up to) chunk size contexts """
+    contexts = iter(contexts)
+    chunk = list(islice(contexts, chunk_size))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(islice(contexts, chunk_size))
+
+
+def tag_intent_documents(contexts, use_store=use_parse_store, verify=None):
+    """
+    Determines whether each context contains intent, then return intent value and base verb
+    Each worker parses chunks of contexts in batches (spaCy's pipe), then applies the intent rule (see
+    match_basic_intent) to the parsed contexts.
+    Contexts are tagged first, only those with a particle or special auxiliary verb are dependency parsed (the rest
+    get the same intent data from their tags).
+    Parses are kept in the parse store, so later runs (ex. after changing the rule) only parse new contexts.
+    Duplicate contexts (ex. quoted replies) are only tagged once.
+    NOTE: The screen isn't token level, every context still runs through the tagger (and every other component but
+    the parser), so a skipped context only saves the parser's share of the pipeline time rather than the whole parse
+
+    :param contexts: Contexts to tag
+    :param bool use_store: Whether to load and save parses with the parse store, (default use_parse_store)
+    :param int verify: Size of a sample of contexts to check against full parses first, raising on any change in
+        intent (see verify_intent_tagging), (default None)
+    """
+    unique_contexts, inverse = deduplicate(context_texts(contexts), 'contexts')
+    if verify is not None:
+        verify_intent_tagging(unique_contexts, verify)
+
+    # Initialize parse store and worker pool
+    store = ParseStore(store_directory(model_name, unused_components), parse_store_bytes) if use_store else None
+    worker_pool = Pool(n_threads, initializer=worker_init, initargs=(store.directory,) if use_store else ())
+
+    # Process documents
+    packages = (
+        (chunk, store.locate(chunk) if use_store else None) for chunk in chunk_contexts(unique_contexts)
+    )
+    intent_data, num_skipped = [], 0
+    for batch_data, batch_skipped, shard in worker_pool.imap(tag_intent_chunk, packages):
+        intent_data += batch_data
+        num_skipped += batch_skipped
+        if shard is not None:
+            store.add(shard)
+
+    # Close pool and save the parse store
     worker_pool.close()
     worker_pool.join()
+    if use_store:
+        store.save()
+
+    print('Skipped dependency parsing', num_skipped, 'of', len(intent_data), 'unique contexts')
 
-    # Split intent values and base verbs
-    intent_data = asarray(intent_data)
+    # Split intent values and frames, then expand them to every context
+    intent_data = asarray(intent_data, dtype=object).reshape(-1, intent_data_size)
     intent_values = intent_data[:, 0].astype(float)
-    intent_frame = intent_data[:, 1:]
+    intent_frame = IntentFrames.from_rows(intent_values, intent_data[:, 1:]).take(inverse)
+    intent_values = intent_values[inverse]
 
     print('intent percentage', sum(intent_values == 1) / len(intent_values))
 
@@ -171,7 +473,9 @@ def get_intent_terms(contexts, intent_values=None, content_data=None):
         print('Mask computed, running doc matrix', intent_values)
 
     intent_mask = intent_values == 1
-    document_matrix, features = generate_context_matrix(contexts) if content_data is None else content_data
+    if content_data is None:
+        content_data = generate_context_matrix(contexts, context_matrix_capacity)
+    document_matrix, features = content_data
 
     # Get mask for contexts without intent
     no_intent_mask = logical_not(intent_mask)
@@ -2,6 +2,7 @@ from model.extraction import generate_context_matrix
 from model.expansion.intent_seed import get_intent_terms
 from numpy import array, asarray, percentile
 from pandas import DataFrame
+from config import context_matrix_capacity
 
 
 def learn_terms(contexts, terms):
@@ -10,7 +11,7 @@ def learn_terms(contexts, terms):
     terms = set(terms)
 
     # Get context matrix and context terms
-    context_matrix, features = generate_context_matrix(contexts)
+    context_matrix, features = generate_context_matrix(contexts, context_matrix_capacity)
 
     # Generate feature mask
     term_mask = array([feature in terms for feature in features], dtype=bool)
@@ -1,5 +1,8 @@
 from utilities.pre_processing import split_pattern, clean_acronym, pre_intent_clean
-from numpy import asarray
+from utilities.data_management import make_path
+from numpy import asarray, generic
+from itertools import count
+from csv import writer, QUOTE_NONNUMERIC
 
 # The shortest form of intent is 'I will X', which contains three terms
 min_terms_for_intent = 3
@@ -11,26 +14,41 @@ def split_document(document):
         return []
 
     # Split document into contexts using regex pattern and apply clean
-    contexts = [pre_intent_clean(context) for context in split_pattern.split(clean_acronym(document))]
-
-    # If context contains less than three words add it to the preceding context
-    index = 0
-    while index < len(contexts):
-        # If not the first context and it contains less than the min number of terms
-        if index > 0 and len(contexts[index].split(' ')) < min_terms_for_intent:
-            # Add context to previous and delete it (thereby also *incrementing* the index)
-            contexts[index - 1] += contexts[index]
-            del contexts[index]
-        # If the context contains enough terms, move to the next one
+    contexts = []
+    for context in split_pattern.split(clean_acronym(document)):
+        context = pre_intent_clean(context)
+
+        # If not the first context and it contains less than the min number of terms, add it to the preceding context
+        if len(contexts) > 0 and context.count(' ') + 1 < min_terms_for_intent:
+            contexts[-1].append(context)
         else:
-            index += 1
+            contexts.append([context])
+
+    contexts = [''.join(parts) for parts in contexts]
 
     # If document is a single context with less than the min number of terms, discard it
-    if len(contexts) == 1 and len(contexts[0].split(' ')) < min_terms_for_intent:
+    if len(contexts) == 1 and contexts[0].count(' ') + 1 < min_terms_for_intent:
         return []
     return contexts
 
 
+def iterate_contexts(documents, original_indexes=None):
+    """
+    Lazily splits documents into contexts (sentences)
+    :param documents: Iterable collection of documents
+    :param original_indexes: Indexes of the original documents, if not enumeration
+    :return: Generator of corpus index, context index (within its document), and context
+    """
+    corpus_indexes = count() if original_indexes is None else original_indexes
+
+    for corpus_index, document in zip(corpus_indexes, documents):
+        # Split document into non-zero length contexts
+        document_contexts = [context for context in split_document(document) if len(context) > 0]
+
+        for context_index, context in enumerate(document_contexts):
+            yield corpus_index, context_index, context
+
+
 def split_into_contexts(documents, original_indexes=None):
     """
     Splits documents into contexts (sentences)
@@ -38,34 +56,52 @@ def split_into_contexts(documents, original_indexes=None):
     :param original_indexes: Indexes of the original documents, if not enumeration
     :return: List of contexts, Mapping of corpus index to context slice
     """
-    document_indexes = []
-    corpus_contexts = []
+    corpus_indexes, context_indexes, corpus_contexts = [], [], []
 
-    # For each document in corpus
-    for document_index, document in enumerate(documents):
-        # Split document into non-zero length contexts
-        document_contexts = list(filter(
-            lambda content: len(content) > 0 or content == ' ', split_document(document)
-        ))
+    for corpus_index, context_index, context in iterate_contexts(documents, original_indexes):
+        corpus_indexes.append(corpus_index)
+        context_indexes.append(context_index)
+        corpus_contexts.append(context)
 
-        # Compute index of contexts and get index of the original document
-        corpus_index = document_index if original_indexes is None else original_indexes[document_index]
+    document_indexes = asarray([corpus_indexes, context_indexes])
+    return corpus_contexts, document_indexes
 
-        # Add context mapping to dictionary
-        for context_index, _ in enumerate(document_contexts):
-            document_indexes.append((corpus_index, context_index))
 
-        # Add the contexts to the list
-        corpus_contexts += document_contexts
+def write_contexts(path, contexts, clean=None):
+    """
+    Streams contexts to a CSV, in the same format as a saved DataFrame of contexts, document_index, and context_index
+    :param path: Path to the destination CSV
+    :param contexts: Iterable of corpus index, context index, and context (ex. from iterate_contexts)
+    :param clean: Function applied to each context before it is written [optional]
+    :return: Number of contexts written
+    """
+    num_contexts = 0
+    with make_path(path).open(mode='w', newline='', encoding='utf-8') as fl:
+        csv_writer = writer(fl, quoting=QUOTE_NONNUMERIC, lineterminator='\n')
+        csv_writer.writerow(['', 'contexts', 'document_index', 'context_index'])
+
+        for corpus_index, context_index, context in contexts:
+            # Unwrap numpy scalars so indexes are written unquoted, as pandas does
+            corpus_index = corpus_index.item() if isinstance(corpus_index, generic) else corpus_index
+            csv_writer.writerow([num_contexts, context if clean is None else clean(context), corpus_index, context_index])
+            num_contexts += 1
 
-    document_indexes = asarray(document_indexes).transpose()
-    return corpus_contexts, document_indexes
+    return num_contexts
 
 
-def generate_context_matrix(contexts):
-    """ Compute context term matrix for word n-grams """
+def generate_context_matrix(contexts, capacity=None):
+    """
+    Compute context term matrix for word n-grams
+    :param contexts: Array of contexts
+    :param capacity: Maximum number of n-grams counted when selecting features, bounds memory but makes the selection
+        approximate (see sharded_n_gram_matrix) [optional]
+    """
     from sklearn.feature_extraction.text import CountVectorizer
 
+    if capacity is not None:
+        from model.extraction.n_grams import sharded_n_gram_matrix
+        return sharded_n_gram_matrix(contexts, num_features=25000, token_pattern=r'(?u)\b\w\w+\b', capacity=capacity)
+
     # Initialize document vectorizer
     vectorizer = CountVectorizer(ngram_range=(3, 6), max_features=25000)
 
@@ -1,5 +1,10 @@
 from sklearn.feature_extraction.text import CountVectorizer
-from pandas import DataFrame
+from pandas import DataFrame, Series, concat
+from scipy.sparse import vstack
+from numpy import array_split, sort, asarray, int64, partition, searchsorted
+from multiprocessing import Pool
+from functools import partial
+import config
 
 
 def n_gram_matrix(dataset, num_features=10000, use_words=True):
@@ -25,3 +30,178 @@ def n_gram_matrix(dataset, num_features=10000, use_words=True):
     vector_data = vectorizer.fit_transform(dataset['document_content'])
 
     return vector_data, vectorizer.get_feature_names()
+
+
+def count_n_grams(contexts, **vectorizer_options):
+    """ Counts the total occurrences of each n-gram within a shard of contexts """
+    vectorizer = CountVectorizer(**vectorizer_options)
+    try:
+        counts = vectorizer.fit_transform(contexts).sum(axis=0).A1
+    except ValueError:      # Shard without any n-grams
+        return Series(dtype=int64)
+
+    columns = Series(vectorizer.vocabulary_)
+    return Series(counts[columns.values], index=columns.index)
+
+
+def select_n_grams(shard_counts, num_features=None):
+    """
+    Merges the n-gram counts of each shard and selects the most frequent n-grams.
+    NOTE: Ranks n-grams the same way as CountVectorizer's max_features, including how ties are broken
+
+    :param shard_counts: List of n-gram counts (Pandas Series) for each shard
+    :param num_features: Maximum number of n-grams to keep, (default None, all n-grams)
+    :return: Alphabetically sorted array of the selected n-grams
+    """
+    counts = concat(shard_counts).groupby(level=0, sort=False).sum()
+
+    # Order n-grams alphabetically, as CountVectorizer orders its features before selecting them
+    n_grams = counts.index.tolist()
+    order = sorted(range(len(n_grams)), key=n_grams.__getitem__)
+    counts = counts.values[order]
+
+    selected = range(len(order))
+    if num_features is not None and len(counts) > num_features:
+        selected = sort((-counts).argsort()[:num_features])
+
+    return asarray([n_grams[order[index]] for index in selected])
+
+
+def summarize_n_grams(contexts, capacity, chunk_size=10000, **vectorizer_options):
+    """
+    Approximately counts n-grams in bounded memory, keeping a Misra-Gries summary of at most capacity n-grams.
+    Contexts are counted exactly a chunk at a time, then merged into the summary (see merge_n_gram_summaries).
+
+    :param contexts: Array of contexts
+    :param capacity: Maximum number of n-grams kept in the summary
+    :param chunk_size: Number of contexts counted exactly at a time, (default 10,000)
+    :return tuple: Summary of n-gram counts (Pandas Series), total number of n-gram occurrences in the contexts
+    """
+    summary, num_occurrences = Series(dtype=int64), 0
+
+    for start in range(0, len(contexts), chunk_size):
+        chunk_counts = count_n_grams(contexts[start:start + chunk_size], **vectorizer_options)
+        num_occurrences += int(chunk_counts.sum())
+        summary = merge_n_gram_summaries([summary, chunk_counts], capacity)
+
+    return summary, num_occurrences
+
+
+def merge_n_gram_summaries(summaries, capacity):
+    """
+    Merges n-gram count summaries, keeping at most capacity n-grams.
+    When there are more, the (capacity + 1)th largest count is subtracted from every count and non-positive counts are
+    dropped. Summaries merged this way are Misra-Gries summaries of the combined contexts, so for N total n-gram
+    occurrences every n-gram's count is under-estimated by at most N / (capacity + 1) (or dropped if below that).
+    """
+    merged = concat(summaries).groupby(level=0, sort=False).sum()
+
+    if len(merged) > capacity:
+        threshold = -partition(-merged.values, capacity)[capacity]
+        merged = merged[merged > threshold] - threshold
+
+    return merged
+
+
+def transform_n_grams(contexts, vocabulary, **vectorizer_options):
+    """ Computes the n-gram matrix of a shard of contexts for a fixed vocabulary """
+    return CountVectorizer(vocabulary=vocabulary, **vectorizer_options).transform(contexts)
+
+
+def select_candidate_columns(matrix, candidates, num_features, error_bound):
+    """
+    Selects the most frequent n-grams from a matrix of candidate n-gram columns using their exact counts
+
+    :param matrix: Context n-gram matrix of the candidate n-grams
+    :param candidates: Alphabetically sorted array of candidate n-grams
+    :param num_features: Maximum number of n-grams to keep
+    :param error_bound: Maximum under-estimate of the counts used to pick the candidates
+    :return: Matrix of the selected n-grams, selected n-grams
+    """
+    counts = Series(asarray(matrix.sum(axis=0)).reshape(-1), index=candidates)
+    features = select_n_grams([counts], num_features)
+
+    # Selection is exact if every n-gram frequent enough to be selected was certain to be a candidate
+    cutoff = counts[features].min() if len(features) > 0 else 0
+    is_exact = error_bound < 1 or (len(features) == num_features and cutoff > error_bound)
+    print('Selected', len(features), 'of', len(candidates), 'candidate n-grams, selection is',
+          'exact' if is_exact else 'approximate', '(cut-off count %d, error bound %.1f)' % (cutoff, error_bound))
+
+    return matrix[:, searchsorted(candidates, features)], features
+
+
+def sharded_n_gram_matrix(contexts, ngram_range=(3, 6), num_features=500000, token_pattern=r'\b\w+\b', num_shards=None,
+                          capacity=None):
+    """
+    Constructs a context n-gram matrix in parallel, equivalent to CountVectorizer(...).fit_transform(contexts).
+    N-grams are counted per shard, merged to select the most frequent, then each shard is transformed into a block of
+    the matrix.
+    When a capacity is given, each shard only keeps a bounded summary of its n-gram counts, so memory is bounded by the
+    capacity instead of the number of distinct n-grams. The summaries give candidate n-grams, which are transformed and
+    then selected by their exact counts. For N total n-gram occurrences, every n-gram occurring more than
+    N / (capacity + 1) times is a candidate, so the selection is exact (up to the order of tied counts at the cut-off)
+    whenever the least frequent selected n-gram occurs more often than that.
+
+    :param contexts: Array of contexts
+    :param ngram_range: Range of n-gram sizes (in words), (default 3-6)
+    :param num_features: Maximum number of n-grams to keep, (default 500,000)
+    :param token_pattern: Regex pattern of tokens, (default words of at least one character)
+    :param num_shards: Number of shards to split the contexts into, (default config.n_threads)
+    :param capacity: Maximum number of n-grams counted per shard, (default None, count every n-gram exactly)
+    :return: context n-gram matrix (Scipy CSR matrix), features (Numpy ndarray)
+    """
+    n_threads = config.n_threads
+    shards = array_split(contexts, n_threads if num_shards is None else num_shards)
+    vectorizer_options = {'ngram_range': ngram_range, 'token_pattern': token_pattern}
+
+    with Pool(n_threads) as workers:
+        if capacity is None:
+            shard_counts = workers.map(partial(count_n_grams, **vectorizer_options), shards)
+            features = select_n_grams(shard_counts, num_features)
+        else:
+            shard_counts = workers.map(partial(summarize_n_grams, capacity=capacity, **vectorizer_options), shards)
+            num_occurrences = sum(shard_occurrences for _, shard_occurrences in shard_counts)
+            summary = merge_n_gram_summaries([shard_summary for shard_summary, _ in shard_counts], capacity)
+            features = asarray(sorted(summary.index.tolist()))
+        del shard_counts
+
+        vocabulary = {feature: index for index, feature in enumerate(features.tolist())}
+        blocks = workers.map(partial(transform_n_grams, vocabulary=vocabulary, **vectorizer_options), shards)
+
+    document_matrix = vstack(blocks).tocsr()
+    if capacity is not None:
+        document_matrix, features = select_candidate_columns(
+            document_matrix, features, num_features, num_occurrences / (capacity + 1)
+        )
+
+    return document_matrix, features
+
+
+def compare_n_gram_selection(contexts, num_features, capacity, ngram_range=(3, 6), token_pattern=r'\b\w+\b'):
+    """
+    Compares the approximate selection of the most frequent n-grams (see sharded_n_gram_matrix) with the exact selection.
+    NOTE: Counts every n-gram exactly, intended for checking a capacity on a sample of contexts
+
+    :return dict: Report of the selections (recall of the exact n-grams, error bound, whether the selections match)
+    """
+    vectorizer_options = {'ngram_range': ngram_range, 'token_pattern': token_pattern}
+    counts = count_n_grams(contexts, **vectorizer_options)
+    exact = select_n_grams([counts], num_features)
+
+    summary, num_occurrences = summarize_n_grams(contexts, capacity, **vectorizer_options)
+    candidates = summary.index.values
+    approximate = select_n_grams([counts[candidates]], num_features)
+
+    estimate_errors = counts[candidates] - summary
+    cutoff = counts[exact].min() if len(exact) > 0 else 0
+    num_shared = len(set(exact.tolist()) & set(approximate.tolist()))
+
+    return {
+        'distinct_n_grams': len(counts),
+        'candidates': len(candidates),
+        'error_bound': num_occurrences / (capacity + 1),
+        'max_estimate_error': int(estimate_errors.max()) if len(estimate_errors) > 0 else 0,
+        'cutoff_count': int(cutoff),
+        'recall': num_shared / len(exact) if len(exact) > 0 else 1,
+        'identical': len(exact) == len(approximate) and (exact == approximate).all()
+    }
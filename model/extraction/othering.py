@@ -4,8 +4,13 @@ from time import time
 from multiprocessing import Pool
 from sklearn.feature_extraction.text import CountVectorizer
 from itertools import compress
+from utilities.data_management.parse_store import ParseStore, store_directory, parse_stored
 import config
 
+model_name = 'en_core_web_md'
+parsing_chunk_size = 5000      # Documents sent to a worker at a time (and stored in the same parse store shard)
+parse_directory = None
+
 othering_pos = {
     'NOUN',
     'PROPN',
@@ -57,35 +62,46 @@ def contains_pronouns(tokens):
 
 
 def worker_process(package):
-    document, document_filter = package
-    parsed = parser(document)
-
-    has_pronouns = contains_pronouns(parsed)
-    filtered = document_filter(parsed)
+    """ Parses a chunk of documents (loading those in the parse store when given their locations), then filters them """
+    documents, locations, document_filter = package
+    if locations is None or parse_directory is None:
+        parsed, shard = parser.pipe(documents), None
+    else:
+        parsed, shard = parse_stored(parse_directory, documents, locations, parser.pipe, parser.vocab)
 
-    return filtered, has_pronouns
+    return [(document_filter(document), contains_pronouns(document)) for document in parsed], shard
 
 
-def init_workers():
-    global parser
-    parser = load('en_core_web_md')
+def init_workers(*props):
+    """ Initialization function for Pool workers, takes the directory of the parse store (if there is one) """
+    global parser, parse_directory
+    parser = load(model_name)
+    parse_directory = props[0] if len(props) > 0 else None
 
 
-def parse_documents(documents, document_filter):
-    # Initialize processing pool and content
-    workers = Pool(config.n_threads, initializer=init_workers)
+def parse_documents(documents, document_filter, use_store=config.use_parse_store):
+    # Initialize parse store, processing pool, and content
+    store = ParseStore(store_directory(model_name), config.parse_store_bytes) if use_store else None
+    workers = Pool(config.n_threads, initializer=init_workers, initargs=(store.directory,) if use_store else ())
     document_filter = document_filter if document_filter is not None else filter_tokens
 
+    content = documents['document_content'].values
+    chunks = (content[start:start + parsing_chunk_size] for start in range(0, len(content), parsing_chunk_size))
+
     # Parse content and close pool
-    parsed = list(
-        workers.imap(
+    parsed = []
+    for chunk_parsed, shard in workers.imap(
             worker_process,
-            ((document, document_filter) for document in documents['document_content'].values),
-            chunksize=250
-        )
-    )
+            ((chunk, store.locate(chunk) if use_store else None, document_filter) for chunk in chunks)
+    ):
+        parsed += chunk_parsed
+        if shard is not None:
+            store.add(shard)
+
     workers.close()
     workers.join()
+    if use_store:
+        store.save()
     print('Pool done')
 
     documents, has_pronouns = map(list, zip(*parsed))
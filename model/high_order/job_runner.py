@@ -128,6 +128,7 @@ class job_runner:
 
         while True:
             chunk_number += 1
+            chunk_offset = documents_processed
 
             data_start = time()
             data, index = [], 0
@@ -163,7 +164,7 @@ class job_runner:
 
             self.csv_writer.writerows((
                 [index] + doc_data
-                for index, doc_data in enumerate(data, start=documents_processed - limit)
+                for index, doc_data in enumerate(data, start=chunk_offset)
             ))
             # self.csv_writer.writerows(enumerate(data, start=))
             print('Finished chunk', chunk_number)
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from numpy import zeros, float32
+from sys import getsizeof
+
+
+class EmbeddingCache:
+    """
+    Least recently used cache of token embeddings, bounded by number of entries and/or bytes.
+    Vectors are either stored as separate arrays, or as rows of a single preallocated float32 slab.
+    NOTE: Vectors returned from a slab are views, they are only valid until the next token is added to the cache
+    NOTE: Not thread-safe, threads sharing a cache should lock around get and insert (and compute misses outside it)
+    """
+    def __init__(self, compute_vector, embedding_dimension, max_entries=None, max_bytes=None, use_slab=False):
+        """
+        :param compute_vector: Function that computes the embedding of a token (ex. fastText get_word_vector)
+        :param int embedding_dimension: Dimension of the embeddings
+        :param int max_entries: Maximum number of cached tokens, (default None, unbounded)
+        :param int max_bytes: Maximum size of the cached vectors in bytes, (default None, unbounded)
+        :param bool use_slab: Whether to store vectors in a preallocated float32 slab, requires a bound, (default False)
+        """
+        self.compute_vector = compute_vector
+        self.embedding_dimension = embedding_dimension
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()    # Token -> vector (or slab row), ordered from least to most recently used
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.slab = None
+        if use_slab:
+            row_bytes = embedding_dimension * float32().itemsize
+            capacities = [bound for bound in [max_entries, max_bytes // row_bytes if max_bytes else None] if bound]
+            if len(capacities) == 0:
+                raise AttributeError('A slab cache must be bounded by entries or bytes')
+
+            self.slab = zeros((min(capacities), embedding_dimension), float32)
+            self.free_rows = list(range(self.slab.shape[0] - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, token):
+        return token in self.entries
+
+    def __getitem__(self, token):
+        """ Returns the embedding of a token, computing and caching it if needed """
+        if token in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(token)
+            entry = self.entries[token]
+            return self.slab[entry] if self.slab is not None else entry
+
+        self.misses += 1
+        return self.insert(token, self.compute_vector(token))
+
+    def get(self, token):
+        """ Returns the cached embedding of a token (a copy if it is in the slab), None if it isn't cached """
+        if token not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(token)
+        entry = self.entries[token]
+        return self.slab[entry].copy() if self.slab is not None else entry
+
+    def insert(self, token, vector):
+        """ Caches the embedding of a token (ex. computed after get missed), returns the cached vector """
+        if token in self.entries:   # Already added (ex. by another thread)
+            self.entries.move_to_end(token)
+            entry = self.entries[token]
+            return self.slab[entry] if self.slab is not None else entry
+
+        if self.slab is not None:
+            if len(self.free_rows) == 0:
+                self.evict()
+
+            row = self.free_rows.pop()
+            self.slab[row] = vector
+            self.entries[token] = row
+            return self.slab[row]
+
+        self.entries[token] = vector
+        self.num_bytes += vector.nbytes + getsizeof(token)
+        while self.is_full():
+            self.evict()
+
+        return vector
+
+    def is_full(self):
+        """ Whether the cache is over either of its bounds """
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.num_bytes > self.max_bytes and len(self.entries) > 1
+
+    def evict(self):
+        """ Removes the least recently used entry """
+        token, entry = self.entries.popitem(last=False)
+        self.evictions += 1
+
+        if self.slab is not None:
+            self.free_rows.append(entry)
+        else:
+            self.num_bytes -= entry.nbytes + getsizeof(token)
+
+    def clear(self):
+        """ Empties the cache, keeping the counters """
+        if self.slab is not None:
+            self.free_rows = list(range(self.slab.shape[0] - 1, -1, -1))
+        self.entries.clear()
+        self.num_bytes = 0
+
+    def get_stats(self):
+        """ Returns the cache counters (ex. to tune the cache size against the hit rate) """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.slab.nbytes if self.slab is not None else self.num_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0
+        }
@@ -1,13 +1,23 @@
 from fasttext.FastText import _FastText
 from tensorflow.keras.utils import Sequence
-from numpy import zeros, ones, ndarray, abs
-from config import batch_size, max_tokens
+from numpy import zeros, ones, ndarray, abs, float32, int32, int64, argsort, fromiter, empty, arange, asarray, full, nan
+from pandas import Index
+from itertools import chain
+from model.layers.embedding_cache import EmbeddingCache
+from utilities.pre_processing.runtime_processing import VocabularyIndex
+from config import batch_size, max_tokens, embedding_cache_entries, embedding_cache_bytes, embedding_cache_slab
 from math import ceil
+from threading import Lock
 
 
 class RealtimeEmbedding(Sequence):
-    """ Extends TensorFlow Sequence to provide on-the-fly fastText token embedding """
-    def __init__(self, embedding_model, data_source, labels=None, uniform_weights=False):
+    """
+    Extends TensorFlow Sequence to provide on-the-fly fastText token embedding.
+    Safe to use with multiple Keras workers. Process workers are forked, so they share the embedding model and any
+    precomputed embeddings (read only) rather than copying them, each has its own token cache.
+    """
+    def __init__(self, embedding_model, data_source, labels=None, uniform_weights=False, precompute=False,
+                 bucket=False, shuffle_order=None, vocabulary_path=None):
         """
         Implements Keras data sequence for on-the-fly embedding generation
 
@@ -16,11 +26,24 @@ class RealtimeEmbedding(Sequence):
         :param ndarray labels: Array of data labels
         :param bool labels_in_progress: Whether passed labels should be taken as initial labels and marked
         :param bool uniform_weights: Whether weights should be uniform (i.e. 1)
+        :param bool precompute: Whether to embed the vocabulary of the data up front and gather batches from the
+            resulting matrix, rather than embedding each batch's tokens (faster when iterating over the data repeatedly)
+        :param bool bucket: Whether to batch documents of similar length together, padding each batch to its longest
+            document rather than max_tokens (requires a variable length network, predictions are in bucketed order
+            until passed to restore_order)
+        :param ndarray shuffle_order: Permutation of the documents to train in (ex. the shuffle pattern saved with the
+            rough labels), rather than their stored order, (default None)
+        :param Path vocabulary_path: Where the vocabulary index of the precomputed embeddings is saved, and loaded from
+            on later runs while it covers every token of the data, (default None, not saved)
         """
 
         self.embedding_model = embedding_model
         self.embedding_dimension = embedding_model.get_dimension()
-        self.embedding_cache = {}
+        self.embedding_cache = EmbeddingCache(
+            embedding_model.get_word_vector, self.embedding_dimension, max_entries=embedding_cache_entries,
+            max_bytes=embedding_cache_bytes, use_slab=embedding_cache_slab
+        )
+        self.cache_lock = Lock()    # Cache isn't thread-safe, thread workers lock it to look up or add tokens
 
         self.data_source = data_source
         self.working_data_source = self.data_source
@@ -31,11 +54,82 @@ class RealtimeEmbedding(Sequence):
         self.working_mask = None
         self.is_training = False
 
+        # Token ids of each document (0 is padding) and the embedding of each token id, if precomputed
+        self.token_ids = None
+        self.working_token_ids = None
+        self.embedding_matrix = None
+        if precompute:
+            self.precompute_embeddings(vocabulary_path)
+
+        # Position of each document in the shuffled order it is trained in, if shuffled
+        self.shuffle_order = self.shuffle_rank = None
+        if shuffle_order is not None:
+            self.shuffle_order = asarray(shuffle_order)
+            self.shuffle_rank = empty(len(self.shuffle_order), int64)
+            self.shuffle_rank[self.shuffle_order] = arange(len(self.shuffle_order))
+
+        # Number of tokens in each document, if bucketing
+        self.bucket = bucket
+        self.lengths = self.working_lengths = None
+        if bucket:
+            self.lengths = fromiter(
+                (min(document.count(' ') + 1, max_tokens) for document in data_source), int32, len(data_source)
+            )
+            self.working_lengths = self.lengths
+
+        # Documents predicted over (None for every document) and the (length sorted) order they are predicted in
+        self.prediction_indexes = None
+        self.order = self.prediction_order()
+
+        # Order the (masked) documents are trained in
+        self.working_order = self.training_order()
+
         self.concrete_weight = 1
         self.midpoint = 0.5
         self.uniform_weights = uniform_weights
         self.data_length = ceil(len(self.working_data_source) / batch_size)
 
+    def training_order(self, mask=None):
+        """
+        Order documents of the masked data are trained in, shuffled (if there is a shuffle order) then sorted by length
+        (if bucketing, ties stay in shuffled order)
+
+        :param ndarray mask: Mask applied to the data, (default None)
+        :return ndarray: Indexes into the masked data, None for their stored order
+        """
+        order = self.shuffle_order
+        if order is not None and mask is not None:
+            order = argsort(self.shuffle_rank[mask])
+
+        if self.bucket:
+            lengths = self.lengths if mask is None else self.lengths[mask]
+            order = argsort(lengths, kind='stable') if order is None else order[argsort(lengths[order], kind='stable')]
+
+        return order
+
+    def prediction_order(self):
+        """
+        Order documents are predicted in, the prediction indexes sorted by length (if bucketing)
+
+        :return ndarray: Indexes into the data source, None for every document in stored order
+        """
+        indexes = self.prediction_indexes
+        if not self.bucket:
+            return indexes
+
+        if indexes is None:
+            return argsort(self.lengths, kind='stable')
+        return indexes[argsort(self.lengths[indexes], kind='stable')]
+
+    def set_prediction_indexes(self, indexes=None):
+        """
+        Limits the documents predicted over (when not in training mode) to a subset of the data source
+
+        :param ndarray indexes: Indexes of the documents to predict, (default None for every document)
+        """
+        self.prediction_indexes = None if indexes is None else asarray(indexes)
+        self.order = self.prediction_order()
+
     def update_labels(self, new_labels):
         """ Updates the labels being fed """
         self.labels = new_labels.copy()
@@ -56,45 +150,96 @@ class RealtimeEmbedding(Sequence):
         if self.working_mask is not None:   # If not None, apply mask to data
             self.working_data_source = self.data_source[self.working_mask]
             self.working_labels = self.labels[self.working_mask]
+            if self.token_ids is not None:
+                self.working_token_ids = self.token_ids[self.working_mask]
+            if self.bucket:
+                self.working_lengths = self.lengths[self.working_mask]
 
         # If updated mask is None, make working set entire set
         else:
             self.working_data_source = self.data_source
             self.working_labels = self.labels
+            self.working_token_ids = self.token_ids
+            self.working_lengths = self.lengths
 
+        self.working_order = self.training_order(self.working_mask)
         # Recompute data length
         self.data_length = ceil(len(self.working_data_source) / batch_size)
 
-    def get_sample_weights(self, batch_start, batch_end):
+    def get_sample_weights(self, batch_indexes):
         """
         Returns sample weights for data samples.
         Weights are computed using the function w = 2(x - .5) when x = (.5, 1], and the negation when x = [0, .5)
         """
+        labels = self.working_labels[batch_indexes]
         if self.uniform_weights:
-            return ones(batch_end - batch_start)
+            return ones(len(labels))
 
-        labels = self.working_labels[batch_start:batch_end]
         weights = compute_sample_weights(labels, self.midpoint)
 
         return weights
 
-    def embed_data(self, data_subset):
-        """ Computes word embeddings for provided data subset """
+    def precompute_embeddings(self, vocabulary_path=None):
+        """
+        Enumerates the tokens of the data source and computes the embedding matrix of its vocabulary
+
+        :param Path vocabulary_path: Where the vocabulary index is saved (or loaded from), (default None, not saved)
+        """
+        tokens = Index(chain.from_iterable(document.split(' ')[:max_tokens + 1] for document in self.data_source))
+        tokens = tokens.unique()
+
+        # Reuse the saved index unless a token of the data isn't in it (or is the padding index)
+        vocabulary = None
+        if vocabulary_path is not None and vocabulary_path.exists():
+            vocabulary = VocabularyIndex.load(vocabulary_path)
+            found, indexes = vocabulary.lookup(tokens)
+            if not (found & (indexes > 0)).all():
+                vocabulary = None
+                print('Saved vocabulary is missing tokens, rebuilding')
+
+        # Index 0 is left as zeros for padding (a null token in the data, ex. from a leading space, takes a later index)
+        if vocabulary is None:
+            vocabulary = VocabularyIndex.from_tokens([''] + tokens.tolist())
+            if vocabulary_path is not None:
+                vocabulary.save(vocabulary_path)
+
+        self.embedding_matrix = zeros((len(vocabulary), self.embedding_dimension), float32)
+        for token, token_id in zip(vocabulary.tokens, vocabulary.indexes):
+            if token_id > 0:
+                self.embedding_matrix[token_id] = self.embedding_model.get_word_vector(token)
+
+        self.token_ids = vocabulary.encode(self.data_source, max_tokens, keep_null=True)
+        self.working_token_ids = self.token_ids if self.working_mask is None else self.token_ids[self.working_mask]
+        print('Precomputed embeddings of', len(vocabulary) - 1, 'tokens')
+
+    def embed_data(self, data_subset, num_tokens=max_tokens):
+        """ Computes word embeddings for provided data subset, padded (or truncated) to num_tokens """
         # Initialize embedding of data
-        embedded_data = zeros((data_subset.shape[0], max_tokens, self.embedding_dimension), float)
+        embedded_data = zeros((data_subset.shape[0], num_tokens, self.embedding_dimension), float)
 
-        # Embed all documents
-        for doc_index, document in enumerate(data_subset):
-            document_tokens = document.split(' ')[:max_tokens]  # Split document into tokens and limit
+        # Split documents into tokens and limit
+        document_tokens = [document.split(' ')[:num_tokens] for document in data_subset]
 
-            # For each token in document
-            for token_index, token in enumerate(document_tokens):
-                # If token embedding is not already cached, compute it and store
-                if token not in self.embedding_cache:
-                    self.embedding_cache[token] = self.embedding_model.get_word_vector(token)
+        # Look up the cached embeddings, the lock is only held while the cache is read (or added to)
+        with self.cache_lock:
+            vectors = [[self.embedding_cache.get(token) for token in tokens] for tokens in document_tokens]
 
-                # Add embedding to array
-                embedded_data[doc_index, token_index] = self.embedding_cache[token]
+        # Compute embeddings of tokens that weren't cached (once per token)
+        missing = {}
+        for tokens, token_vectors in zip(document_tokens, vectors):
+            for token, vector in zip(tokens, token_vectors):
+                if vector is None and token not in missing:
+                    missing[token] = self.embedding_cache.compute_vector(token)
+
+        # For each token in each document, add embedding to array
+        for doc_index, (tokens, token_vectors) in enumerate(zip(document_tokens, vectors)):
+            for token_index, (token, vector) in enumerate(zip(tokens, token_vectors)):
+                embedded_data[doc_index, token_index] = missing[token] if vector is None else vector
+
+        if len(missing) > 0:
+            with self.cache_lock:
+                for token, vector in missing.items():
+                    self.embedding_cache.insert(token, vector)
 
         return embedded_data
 
@@ -103,30 +248,64 @@ class RealtimeEmbedding(Sequence):
         if self.is_training:
             return self.data_length
 
-        return ceil(len(self.data_source) / batch_size)
+        num_predicted = len(self.data_source) if self.prediction_indexes is None else len(self.prediction_indexes)
+        return ceil(num_predicted / batch_size)
+
+    def restore_order(self, predictions, fill=None):
+        """
+        Reorders predictions made over the data source (not in training mode) back to the order of the documents
+
+        :param ndarray predictions: Predictions, in the order they were made
+        :param ndarray fill: Values for the documents that weren't predicted (ex. earlier predictions), (default nan)
+        :return ndarray: Predictions of every document in the data source
+        """
+        if self.order is None:
+            return predictions
+
+        shape = (len(self.data_source),) + predictions.shape[1:]
+        if self.prediction_indexes is None:
+            restored = empty(shape, predictions.dtype)
+        elif fill is None:
+            restored = full(shape, nan, predictions.dtype)
+        else:
+            restored = asarray(fill, predictions.dtype).reshape(shape).copy()
+
+        restored[self.order] = predictions
+        return restored
 
     def __getitem__(self, index):
         """ Provides the batch of data at a given index """
         batch_start = int(index * batch_size)
         batch_end = batch_start + batch_size
 
+        # Get indexes of the batch, training batches are taken in shuffled order and, when bucketing, batches are taken
+        # in order of document length
+        batch_indexes = slice(batch_start, batch_end)
+        order = self.working_order if self.is_training else self.order
+        if order is not None:
+            batch_indexes = order[batch_indexes]
+
+        num_tokens = max_tokens
+        if self.bucket:
+            num_tokens = (self.working_lengths if self.is_training else self.lengths)[batch_indexes].max()
+
         # Get batch of data
         source = self.working_data_source if self.is_training else self.data_source
-        working_data = source[batch_start:batch_end]
+        working_data = source[batch_indexes]
 
-        # Correct batch end to reflect current atch index
-        if batch_end > len(source):
-            batch_end = len(source)
-
-        embedded_data = self.embed_data(working_data)
+        if self.embedding_matrix is not None:
+            token_ids = self.working_token_ids if self.is_training else self.token_ids
+            embedded_data = self.embedding_matrix[token_ids[batch_indexes, :num_tokens]]
+        else:
+            embedded_data = self.embed_data(working_data, num_tokens)
 
         # If training also return labels
         if self.is_training:
             # Get batch labels and convert to boolean
-            label_subset = self.working_labels[batch_start:batch_end]
+            label_subset = self.working_labels[batch_indexes]
             label_subset = label_subset > self.midpoint
 
-            loss_weights = self.get_sample_weights(batch_start, batch_end)
+            loss_weights = self.get_sample_weights(batch_indexes)
 
             return embedded_data, label_subset, loss_weights
         return embedded_data
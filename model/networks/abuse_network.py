@@ -1,5 +1,5 @@
 from keras import Sequential
-from keras.layers import Bidirectional, LSTM, Dense, Embedding, TimeDistributed, InputLayer
+from keras.layers import Bidirectional, LSTM, Dense, Embedding, TimeDistributed, InputLayer, Masking
 from keras.initializers import Constant
 from model.layers.attention import AttentionWithContext
 
@@ -23,12 +23,13 @@ def get_core_abuse_layers(max_tokens):
     return core_layers
 
 
-def generate_abuse_network(max_tokens, embedding_dimension=None, embedding_matrix=None):
+def generate_abuse_network(max_tokens, embedding_dimension=None, embedding_matrix=None, variable_length=False):
     """
     Generates abuse network
     :param max_tokens: Maximum tokens for input sequence
     :param embedding_dimension: Dimension of the word embeddings [optional]
     :param embedding_matrix: Matrix of pre-computed word embeddings [optional]
+    :param variable_length: Whether to accept sequences of any length up to max_tokens, masking zero padding [optional]
     :return: Abuse network
     """
 
@@ -44,14 +45,17 @@ def generate_abuse_network(max_tokens, embedding_dimension=None, embedding_matri
     model_layers = get_core_abuse_layers(max_tokens)
 
     # If training model, add embedding layer to start of model
+    sequence_length = None if variable_length else max_tokens
     if is_production:
-        model_layers.insert(0, InputLayer(input_shape=(max_tokens, embedding_dimension)))
+        model_layers.insert(0, InputLayer(input_shape=(sequence_length, embedding_dimension)))
+        if variable_length:
+            model_layers.insert(1, Masking(mask_value=0.))
     else:
         num_embeddings = embedding_matrix.shape[0]
 
         embedding_layer = Embedding(
             num_embeddings, embedding_dimension, embeddings_initializer=Constant(embedding_matrix),
-            input_length=max_tokens, trainable=False, mask_zero=True, name=('embedding_' + str(num_embeddings))
+            input_length=sequence_length, trainable=False, mask_zero=True, name=('embedding_' + str(num_embeddings))
         )
         model_layers.insert(0, embedding_layer)
 
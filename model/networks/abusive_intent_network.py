@@ -1,47 +1,60 @@
 from utilities.data_management.model_management import load_model_weights
-from utilities.data_management import get_embedding_path, get_model_path
+from utilities.data_management import get_embedding_path, get_model_path, deduplicate
 from utilities.pre_processing import runtime_clean
-from keras.layers import Input, Bidirectional, LSTM, Dense, TimeDistributed, Embedding, Multiply
+from keras.layers import Input, Bidirectional, LSTM, Dense, TimeDistributed, Embedding, Multiply, Masking
 from model.layers.attention import AttentionWithContext
 from model.layers.realtime_embedding import RealtimeEmbedding
 from keras.models import Model
 from keras.initializers import Constant
 from fasttext import load_model
 from numpy import hstack, ndarray
-from config import execute_verbosity, max_tokens, embedding_dimension
+from config import execute_verbosity, max_tokens, embedding_dimension, data_workers, use_multiprocessing, \
+    max_queue_size, bucket_by_length
 
 
 def predict_abusive_intent(raw_documents, network=None, return_model=False):
     """
     Makes abusive intent predictions for a list of pre-processed documents
 
-    :param ndarray raw_documents: array of pre-processed documents
+    :param ndarray raw_documents: array of pre-processed documents (duplicates are only predicted once)
     :param Model network: keras network trained to predict abuse and intent
     :param bool return_model: Whether to return the model as well as the predictions
     :return tuple: tuple of abuse, intent, and abusive-intent predictions
     """
+    inverse = None
     if network is None:
         embedding_path = get_embedding_path()
         intent_path = get_model_path('intent')
         abuse_path = get_model_path('abuse')
 
-        documents = runtime_clean(raw_documents)
+        documents, inverse = deduplicate(runtime_clean(raw_documents), 'documents')
         embedding_model = load_model(embedding_path)
-        raw_documents = RealtimeEmbedding(embedding_model, documents)
+        raw_documents = RealtimeEmbedding(embedding_model, documents, bucket=bucket_by_length)
         print('Loaded embeddings')
 
-        network = generate_abusive_intent_network(max_tokens, embedding_dimension=embedding_dimension)
+        network = generate_abusive_intent_network(
+            max_tokens, embedding_dimension=embedding_dimension, variable_length=bucket_by_length
+        )
         load_model_weights(network, intent_path)
         load_model_weights(network, abuse_path)
         print(network.summary())
 
-    predictions = hstack(network.predict_generator(raw_documents, verbose=execute_verbosity)).transpose()
+    predictions = hstack(network.predict_generator(
+        raw_documents, verbose=execute_verbosity, workers=data_workers, use_multiprocessing=use_multiprocessing,
+        max_queue_size=max_queue_size
+    ))
+    if isinstance(raw_documents, RealtimeEmbedding):
+        predictions = raw_documents.restore_order(predictions)
+    if inverse is not None:
+        predictions = predictions[inverse]
+
+    predictions = predictions.transpose()
     if return_model:
         return network, predictions
     return predictions
 
 
-def generate_abusive_intent_network(max_tokens, embedding_dimension=None, embedding_matrix=None):
+def generate_abusive_intent_network(max_tokens, embedding_dimension=None, embedding_matrix=None, variable_length=False):
     # Check if either the dimension or the embeddings or embeddings are provided.
     if embedding_dimension is None and embedding_matrix is None:
         raise AttributeError('Must provide either dimension of embedding or pre-computed embeddings')
@@ -52,9 +65,12 @@ def generate_abusive_intent_network(max_tokens, embedding_dimension=None, embedd
     attention_size = int(max_tokens / 2)
     final_dense_size = 50
 
-    # Define network
-    input_shape = (max_tokens, embedding_dimension) if is_production else (max_tokens,)
+    # Define network, sequences of any length are accepted when variable length (zero padding is masked)
+    sequence_length = None if variable_length else max_tokens
+    input_shape = (sequence_length, embedding_dimension) if is_production else (sequence_length,)
     core_input = network_input = Input(shape=input_shape)
+    if is_production and variable_length:
+        core_input = Masking(mask_value=0.)(network_input)
 
     # If not generating for production, add embedding layer
     if not is_production:
@@ -62,7 +78,7 @@ def generate_abusive_intent_network(max_tokens, embedding_dimension=None, embedd
 
         core_input = Embedding(
             num_embeddings, embedding_dimension, embeddings_initializer=Constant(embedding_matrix),
-            input_length=max_tokens, trainable=False, mask_zero=True, name=('embedding_' + str(num_embeddings))
+            input_length=sequence_length, trainable=False, mask_zero=True, name=('embedding_' + str(num_embeddings))
         )(network_input)
 
     # Abuse
@@ -2,3 +2,4 @@ from model.training.term_reinforce import *
 from model.training.deep_reinforce import *
 from model.training.consensus import *
 from model.training.term_complex_reinforce import *
+from model.training.scheduling import *
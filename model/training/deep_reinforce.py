@@ -1,12 +1,14 @@
-from numpy import percentile, min, max, ndarray, argsort, sum
+from numpy import percentile, min, max, ndarray, argsort, sum, abs, where
 from pandas import DataFrame
 from keras.models import Model
 from model.layers.realtime_embedding import RealtimeEmbedding
-from model.training.rate_limiting import deep_rate_limit
-from config import training_verbosity, confidence_increment, batch_size, prediction_threshold
+from model.training.rate_limiting import deep_rate_limit, midpoint
+from config import training_verbosity, confidence_increment, batch_size, prediction_threshold, data_workers, \
+    use_multiprocessing, max_queue_size
 
 
 deep_history = None
+deep_predictions = None     # Predictions of the latest round, reused for contexts that aren't predicted again
 
 
 def save_deep_history(filename):
@@ -65,6 +67,15 @@ def train_deep_learner(model, current_labels, data_source, training_documents=25
     :param float min_confidence: Min predicted value for document to *contain intent* [default .985]
     :return model, current labels, new_predictions
     """
+    global deep_predictions
+
+    # Solid contexts (labelled 0 or 1) can't be changed by the consensus, so after the first round only the rest are
+    # predicted. Solid contexts keep their latest (stale) predictions, which are left out of rate limiting so they
+    # don't take slots from the predicted contexts (unlike predicting every context, where they can be moved off 0)
+    [unfrozen_indexes] = where(abs(midpoint - current_labels) < midpoint)
+    if deep_predictions is None or len(deep_predictions) != len(current_labels):
+        unfrozen_indexes = None
+
     data_source.update_labels(current_labels)
 
     # Get subset of non uncertain data to use for training
@@ -79,16 +90,31 @@ def train_deep_learner(model, current_labels, data_source, training_documents=25
 
     # Train model
     data_source.set_usage_mode(True)
-    history = model.fit_generator(data_source, verbose=training_verbosity, steps_per_epoch=training_steps, shuffle=True).history
+    history = model.fit_generator(data_source, verbose=training_verbosity, steps_per_epoch=training_steps, shuffle=True,
+                                  workers=data_workers, use_multiprocessing=use_multiprocessing,
+                                  max_queue_size=max_queue_size).history
 
     push_history(history)
 
-    # Make predictions for all documents
+    # Make predictions for all (unfrozen) documents
     data_source.set_usage_mode(False)
-    predictions = model.predict_generator(data_source, verbose=training_verbosity).reshape(-1)
+    data_source.set_prediction_indexes(unfrozen_indexes)
+    if len(data_source) > 0:
+        predictions = model.predict_generator(data_source, verbose=training_verbosity, workers=data_workers,
+                                              use_multiprocessing=use_multiprocessing,
+                                              max_queue_size=max_queue_size)
+        predictions = data_source.restore_order(predictions, fill=deep_predictions).reshape(-1)
+    else:
+        predictions = deep_predictions.copy()
+
+    data_source.set_prediction_indexes(None)
+    deep_predictions = predictions
+
+    if training_verbosity > 0 and unfrozen_indexes is not None:
+        print('Predicted %d of %d documents' % (len(unfrozen_indexes), len(current_labels)))
 
     # Compute mask of documents with positive and negative intent
-    new_positives, new_negatives = deep_rate_limit(predictions, current_labels, min_confidence)
+    new_positives, new_negatives = deep_rate_limit(predictions, current_labels, min_confidence, unfrozen_indexes)
 
     # Apply confidence modifications to new labels
     current_labels[new_positives] += confidence_increment
@@ -1,5 +1,7 @@
-from numpy import argsort, all, logical_not, zeros_like, sum, zeros, ndarray, flip, abs, asarray
+from numpy import argsort, all, logical_not, zeros_like, ones_like, sum, zeros, ndarray, flip, abs, asarray, repeat, \
+    arange, diff, unique, full, bincount, cumsum, searchsorted
 from scipy.sparse import csc_matrix
+from utilities.analysis import rank_indexes
 
 midpoint = 0.5
 
@@ -17,35 +19,45 @@ def get_max_moves(current_labels):
     return num_positive, num_negative
 
 
-def deep_rate_limit(predictions, current_labels, threshold):
+def deep_rate_limit(predictions, current_labels, threshold, candidate_indexes=None):
     """
     Computes the contexts that should be incremented while only making a finite number of changes
 
     :param ndarray predictions: Array of predictions from the deep learner
     :param ndarray current_labels: Array containing the current labels being used in training
     :param float threshold: Threshold value that predictions must pass to have their label changed
+    :param ndarray candidate_indexes: Indexes of the contexts that can be changed, the rest are neither thresholded
+        nor ranked (ex. contexts with stale predictions), (default None for every context)
     """
     certain_positives = current_labels == 1
     max_positive, max_negative = get_max_moves(current_labels)
 
     neg_threshold = (1 - threshold) * 2
 
-    new_positives = all([predictions > threshold, logical_not(certain_positives)], axis=0)
+    # Rank the candidates' predictions only, mapping the selection back to context indexes
+    if candidate_indexes is None:
+        candidates = ones_like(current_labels, dtype=bool)
+        candidate_indexes = arange(len(current_labels))
+    else:
+        candidates = zeros_like(current_labels, dtype=bool)
+        candidates[candidate_indexes] = True
+    ranked = predictions[candidate_indexes]
+
+    def top_indexes(k, largest):
+        return candidate_indexes[rank_indexes(ranked, k, largest=largest, ordered=False)]
+
+    new_positives = all([predictions > threshold, logical_not(certain_positives), candidates], axis=0)
 
     if sum(new_positives) > max_positive:
-        sorted_indexes = flip(argsort(predictions))
         new_positives = zeros_like(new_positives, dtype=bool)
-
-        new_positives[sorted_indexes[:max_positive]] = True
+        new_positives[top_indexes(max_positive, True)] = True
 
     certain_negatives = current_labels == 0
-    new_negatives = all([predictions < neg_threshold, logical_not(certain_negatives)], axis=0)
+    new_negatives = all([predictions < neg_threshold, logical_not(certain_negatives), candidates], axis=0)
 
     if sum(new_negatives) > max_negative:
-        sorted_indexes = argsort(predictions)
         new_negatives = zeros_like(new_negatives, dtype=bool)
-
-        new_negatives[sorted_indexes[:max_negative]] = True
+        new_negatives[top_indexes(max_negative, False)] = True
 
     return new_positives, new_negatives
 
@@ -69,10 +81,13 @@ def term_rate_limit(positive_matrix, negative_matrix, current_labels):
 
 def compute_context_sums(matrix, max_moves):
     """
-    Determines the contexts that will be incremented this training round
+    Determines the contexts that will be incremented this training round, i.e. the contexts covered by the sequence
+    columns up to (and including) the first column at which more than max_moves contexts are covered.
+    NOTE: Assumes the matrix holds (non-negative) counts
 
     :param csc_matrix matrix: Sparse sequence context column matrix
     :param int max_moves: Maximum number of contexts that can be *changed* in the round
+    :return tuple[ndarray, int]: Mask of the contexts and index of the last column used
     """
     if not isinstance(matrix, csc_matrix):
         raise TypeError('Passed matrix must be a CSC matrix')
@@ -81,13 +96,15 @@ def compute_context_sums(matrix, max_moves):
     if sum(contains_sequence) <= max_moves:
         return contains_sequence > 0, matrix.shape[1]
 
-    num_contexts = matrix.shape[0]
-    context_sums = zeros(num_contexts, dtype=int)
-    for feature_index in range(matrix.shape[1]):
-        data_slice = matrix[:, feature_index]
-        context_sums[data_slice.indices] += data_slice.data
+    # Find the first column covering each context (entries are stored column by column)
+    columns = repeat(arange(matrix.shape[1]), diff(matrix.indptr))
+    positive = matrix.data > 0
+    covered_contexts, first_entries = unique(matrix.indices[positive], return_index=True)
+    first_columns = full(matrix.shape[0], matrix.shape[1])
+    first_columns[covered_contexts] = columns[positive][first_entries]
 
-        if sum(context_sums > 0) > max_moves:
-            return context_sums > 0, feature_index
+    # Stop at the first column where the number of covered contexts passes max moves
+    coverage = cumsum(bincount(first_columns[covered_contexts], minlength=matrix.shape[1]))
+    feature_index = int(searchsorted(coverage, max_moves, side='right'))
 
-    raise RuntimeError('Loop should have terminated. Error in stopping condition.')
+    return first_columns <= feature_index, feature_index
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+
+def timed(name, function, args):
+    """ Runs a function, printing its wall time """
+    start_time = time()
+    result = function(*args)
+    print(name, 'completed in %.1fs' % (time() - start_time))
+
+    return result
+
+
+def run_learners(learners, concurrent=True):
+    """
+    Runs the learners of a training round, by default at the same time. The last learner runs in the calling thread
+    (ex. the deep learner, as Keras expects) while the others run in threads (ex. the term learner, whose sparse and
+    numpy operations mostly release the GIL).
+    NOTE: Learners must not modify the arguments of another learner (ex. pass copies of shared labels)
+
+    :param list learners: Name, function, and arguments of each learner
+    :param bool concurrent: Whether to run the learners at the same time rather than in order, (default True)
+    :return list: Result of each learner
+    """
+    if not concurrent or len(learners) < 2:
+        return [timed(*learner) for learner in learners]
+
+    with ThreadPoolExecutor(len(learners) - 1) as executor:
+        futures = [executor.submit(timed, *learner) for learner in learners[:-1]]
+        last_result = timed(*learners[-1])
+
+        return [future.result() for future in futures] + [last_result]
@@ -1,4 +1,5 @@
 from utilities.data_management import vector_to_file
+from utilities.analysis import rank_indexes
 from model.training.rate_limiting import term_rate_limit
 from numpy import around, percentile, logical_not, asarray, ndarray, sum, argsort, all, flip, log, where
 from scipy.sparse import csr_matrix
@@ -45,14 +46,6 @@ def push_sequence_history(positive_rates, negative_rates):
         sequence_history[negative_key].append(negative_rates)
 
 
-def sequence_counts(document_matrix, mask):
-    """ Get count of each token in document matrix under a specific mask """
-    target_documents = document_matrix[mask]
-    [token_sums] = asarray(target_documents.sum(axis=0))
-
-    return token_sums
-
-
 def compute_sequence_rates(positive_counts, negative_counts, num_positive_documents, num_negative_documents):
     """
     Computes the normalized rates for each sequence
@@ -91,7 +84,7 @@ def get_significant_tokens(token_frequencies, target_column, threshold=sequence_
     significance_mask = frequencies > threshold_value                       # Compute mask of values above threshold
     [index_map] = where(significance_mask)
 
-    subset_indexes = flip(argsort(frequencies[significance_mask]))
+    subset_indexes = rank_indexes(frequencies[significance_mask], largest=True)
     return index_map[subset_indexes]
 
 
@@ -101,20 +94,19 @@ def train_sequence_learner(current_labels, sequences, document_matrix):
 
     :param ndarray current_labels: Array of current intent labels
     :param list sequences: List of token n-grams listed in the document matrix
-    :param csr_matrix document_matrix: Sparse document matrix
+    :param SequenceMatrix document_matrix: Sparse document matrix, wrapped once by the caller (see SequenceMatrix)
     :return: intent tokens, non-intent tokens tokens, updated labels
     """
-
-    # Get subset of non uncertain data to use for training
+    # Get masks of non uncertain data to use for training
     useful_mask = current_labels != .5
-    training_matrix = document_matrix[useful_mask]
+    rounded_labels = around(current_labels).astype(bool)
 
-    positive_mask = around(current_labels[useful_mask]).astype(bool)  # Get mask for examples of positive intent
-    negative_mask = logical_not(positive_mask)                        # Get mask for examples of negative intent
+    positive_mask = all([useful_mask, rounded_labels], axis=0)                      # Examples of positive intent
+    negative_mask = all([useful_mask, logical_not(rounded_labels)], axis=0)         # Examples of negative intent
 
-    # Get number of occurrences of tokens in positive, negative, and uncertain documents
-    positive_count = sequence_counts(training_matrix, positive_mask)
-    negative_count = sequence_counts(training_matrix, negative_mask)
+    # Get number of occurrences of tokens in positive and negative documents
+    positive_count = document_matrix.class_counts(positive_mask)
+    negative_count = document_matrix.class_counts(negative_mask)
 
     # token_totals = positive_count + negative_count + uncertain_count
     num_positive_documents = sum(positive_mask)
@@ -132,9 +124,8 @@ def train_sequence_learner(current_labels, sequences, document_matrix):
     positive_indexes = get_significant_tokens(token_frequencies, 1)
     negative_indexes = get_significant_tokens(token_frequencies, 2)
 
-    document_matrix = document_matrix.tocsc()
-    positive_matrix = document_matrix[:, positive_indexes]
-    negative_matrix = document_matrix[:, negative_indexes]
+    positive_matrix = document_matrix.columns(positive_indexes)
+    negative_matrix = document_matrix.columns(negative_indexes)
 
     packed_data = term_rate_limit(positive_matrix, negative_matrix, current_labels)
     has_intent_terms, has_non_intent_terms, intent_index, non_intent_index = packed_data
@@ -0,0 +1,87 @@
+from utilities.data_management.checkpoints import ShardCheckpoint
+import utilities.pre_processing.process as process_module
+from pandas import DataFrame, read_csv
+import pytest
+
+num_documents = 100
+chunk_size = 10
+crash_document = 'document 55'
+
+
+def get_content(document):
+    return document[0]
+
+
+def save_content(content, values, document):
+    return values + [content]
+
+
+def mark_first(document):
+    if document == crash_document:
+        raise RuntimeError('Killed mid run')
+    return None, document + ' (first run)'
+
+
+def mark_second(document):
+    return None, document + ' (second run)'
+
+
+@pytest.fixture
+def source_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(process_module, 'n_threads', 2)
+
+    path = tmp_path / 'source.csv'
+    DataFrame({'document_content': ['document %d' % index for index in range(num_documents)]}).to_csv(path)
+    return path
+
+
+def run(source_path, dest_path, process):
+    options = {'chunk_size': chunk_size, 'worker_chunk_size': 4, 'resumable': True}
+    process_module.process_documents(source_path, dest_path, [process], get_content, save_content,
+                                     ['index', 'document_content'], options)
+
+
+def test_resume_after_kill(source_path, tmp_path):
+    dest_path = tmp_path / 'dest.csv'
+
+    # Kill the run part way through, the destination must not look finished
+    with pytest.raises(RuntimeError):
+        run(source_path, dest_path, mark_first)
+    assert not dest_path.exists()
+
+    checkpoint = ShardCheckpoint(dest_path, source_path)
+    num_written = checkpoint.load_shards()
+    assert num_written == 5
+
+    # Corrupt the last recorded shard and leave a half written shard after it
+    last_shard = checkpoint.shard_path(num_written - 1)
+    last_shard.write_bytes(last_shard.read_bytes()[:15])
+    checkpoint.shard_path(num_written).write_text('50,document 50 (fi')
+
+    run(source_path, dest_path, mark_second)
+    result = read_csv(dest_path)
+
+    # Shards before the corrupt one are kept, everything after is redone
+    resumed_from = (num_written - 1) * chunk_size
+    expected = ['document %d (%s run)' % (index, 'first' if index < resumed_from else 'second')
+                for index in range(num_documents)]
+    assert result['index'].tolist() == list(range(num_documents))
+    assert result['document_content'].tolist() == expected
+    assert not checkpoint.directory.exists()
+
+
+def test_truncate_resume_position(source_path, tmp_path):
+    dest_path = tmp_path / 'dest.csv'
+    with pytest.raises(RuntimeError):
+        run(source_path, dest_path, mark_first)
+
+    checkpoint = ShardCheckpoint(dest_path, source_path)
+    checkpoint.load_shards()
+    start, rows_done = checkpoint.truncate(2)
+
+    # Reading the source from the resume position continues at the first row of the third chunk
+    with source_path.open(mode='r', newline='') as source_file:
+        source_file.seek(start)
+        assert source_file.readline().startswith('%d,document %d' % (rows_done, rows_done))
+    assert rows_done == 2 * chunk_size
+    assert ShardCheckpoint(dest_path, source_path).resume() == (start, rows_done)
@@ -0,0 +1,50 @@
+from utilities.pre_processing.html_formatting import remove_quotes
+from bs4 import BeautifulSoup
+import pytest
+
+quote = '<div style="margin:20px; margin-top:5px; ">'
+citation = '<div align="right">'
+
+
+def soup_count(document):
+    """ Number of quotes BeautifulSoup finds (the previous implementation of remove_quotes) """
+    return len(BeautifulSoup(document, 'html.parser').find_all('div', {'style': 'margin:20px; margin-top:5px; '}))
+
+
+def test_quote_removed():
+    document = '<p>reply</p>' + quote + 'quoted <b>text</b></div>' + citation + 'Quote:</div><p>end</p>'
+    assert remove_quotes(document) == (1, '<p>reply</p><p>end</p>')
+
+
+def test_quote_within_comment():
+    document = '<p>before</p><!-- ' + quote + ' --><p>after</p>'
+    assert remove_quotes(document) == (soup_count(document), document)
+    assert soup_count(document) == 0
+
+
+@pytest.mark.parametrize('skipped', [
+    '<!--' + quote + '-->',
+    '<![CDATA[' + quote + ']]>',
+    '<!DOCTYPE html>',
+    '<script>var text = \'' + quote + '\';</script>',
+    '<STYLE>div:after { content: "' + quote + '" }</STYLE>',
+])
+def test_skipped_regions(skipped):
+    document = '<div>' + skipped + '<p>kept</p></div>'
+    assert remove_quotes(document) == (0, document)
+
+
+def test_unterminated_comment():
+    document = '<p>before</p><!-- ' + quote + '<p>after</p>'
+    assert remove_quotes(document) == (0, document)
+
+
+def test_unclosed_quote():
+    document = '<p>before</p>' + quote + 'quoted <b>text</b><p>rest of the document'
+    assert remove_quotes(document) == (soup_count(document), '<p>before</p>')
+    assert soup_count(document) == 1
+
+
+def test_quote_closed_by_parent():
+    document = '<blockquote>' + quote + 'quoted</blockquote><p>after</p>'
+    assert remove_quotes(document) == (1, '<blockquote></blockquote><p>after</p>')
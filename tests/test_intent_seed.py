@@ -0,0 +1,197 @@
+import pytest
+
+spacy = pytest.importorskip('spacy')
+
+from model.expansion import intent_seed
+from spacy.tokens import Doc
+from spacy.attrs import POS, TAG, HEAD, DEP
+from numpy import array, uint64
+from random import Random
+
+contexts = [
+    'I will attack them tomorrow', 'We are going to win the game', 'I am not going to do that',
+    'i\'ll go there after work', 'Will you go to the store?', 'Why would we want to leave',
+    'They will call the police', 'I\'m gonna buy a new car', 'We must finish the report today',
+    'I went to the store yesterday', 'The weather is nice', 'Go home', 'She likes running',
+    'I really want to see the movie', 'If we go, I will drive', 'thanks', '', float('nan'),
+]
+
+# Parsed sentences, each token is (text, pos, tag, head, dependency)
+parsed_sentences = {
+    'will': [('i', 'PRON', 'PRP', 2, 'nsubj'), ('will', 'VERB', 'MD', 2, 'aux'), ('attack', 'VERB', 'VB', 2, 'ROOT'),
+             ('them', 'PRON', 'PRP', 2, 'dobj'), ('tomorrow', 'NOUN', 'NN', 2, 'npadvmod')],
+    'short will': [('we', 'PRON', 'PRP', 2, 'nsubj'), ('ll', 'VERB', 'MD', 2, 'aux'), ('go', 'VERB', 'VB', 2, 'ROOT')],
+    'going to': [('we', 'PRON', 'PRP', 2, 'nsubj'), ('are', 'VERB', 'VBP', 2, 'aux'),
+                 ('going', 'VERB', 'VBG', 2, 'ROOT'), ('to', 'PART', 'TO', 4, 'aux'),
+                 ('win', 'VERB', 'VB', 2, 'xcomp'), ('the', 'DET', 'DT', 6, 'det'), ('big', 'ADJ', 'JJ', 6, 'compound'),
+                 ('game', 'NOUN', 'NN', 4, 'dobj')],
+    'want to': [('i', 'PRON', 'PRP', 1, 'nsubj'), ('want', 'VERB', 'VBP', 1, 'ROOT'), ('to', 'PART', 'TO', 3, 'aux'),
+                ('leave', 'VERB', 'VB', 1, 'xcomp'), ('now', 'ADV', 'RB', 3, 'advmod')],
+    'negation': [('i', 'PRON', 'PRP', 3, 'nsubj'), ('am', 'VERB', 'VBP', 3, 'aux'), ('not', 'PART', 'RB', 3, 'neg'),
+                 ('going', 'VERB', 'VBG', 3, 'ROOT'), ('to', 'PART', 'TO', 5, 'aux'), ('do', 'VERB', 'VB', 3, 'xcomp'),
+                 ('that', 'PRON', 'DT', 5, 'dobj')],
+    'double negation': [('we', 'PRON', 'PRP', 3, 'nsubj'), ('not', 'PART', 'RB', 3, 'neg'),
+                        ('never', 'ADV', 'RB', 3, 'neg'), ('want', 'VERB', 'VBP', 3, 'ROOT'),
+                        ('to', 'PART', 'TO', 5, 'aux'), ('stop', 'VERB', 'VB', 3, 'xcomp')],
+    'question': [('will', 'VERB', 'MD', 2, 'aux'), ('you', 'PRON', 'PRP', 2, 'nsubj'), ('go', 'VERB', 'VB', 2, 'ROOT'),
+                 ('to', 'ADP', 'IN', 2, 'prep'), ('the', 'DET', 'DT', 5, 'det'), ('store', 'NOUN', 'NN', 3, 'pobj')],
+    'wh question': [('why', 'ADV', 'WRB', 3, 'advmod'), ('would', 'VERB', 'MD', 3, 'aux'),
+                    ('we', 'PRON', 'PRP', 3, 'nsubj'), ('want', 'VERB', 'VB', 3, 'ROOT'),
+                    ('to', 'PART', 'TO', 5, 'aux'), ('leave', 'VERB', 'VB', 3, 'xcomp')],
+    'if question': [('if', 'SCONJ', 'IN', 3, 'mark'), ('we', 'PRON', 'PRP', 3, 'nsubj'),
+                    ('must', 'VERB', 'MD', 3, 'aux'), ('go', 'VERB', 'VB', 3, 'ROOT')],
+    'third person': [('they', 'PRON', 'PRP', 2, 'nsubj'), ('will', 'VERB', 'MD', 2, 'aux'),
+                     ('call', 'VERB', 'VB', 2, 'ROOT'), ('the', 'DET', 'DT', 4, 'det'),
+                     ('police', 'NOUN', 'NN', 2, 'dobj')],
+    'second then first person': [('you', 'PRON', 'PRP', 2, 'nsubj'), ('will', 'VERB', 'MD', 2, 'aux'),
+                                 ('see', 'VERB', 'VB', 2, 'ROOT'), ('we', 'PRON', 'PRP', 5, 'nsubj'),
+                                 ('will', 'VERB', 'MD', 5, 'aux'), ('win', 'VERB', 'VB', 2, 'ccomp')],
+    'past desire': [('i', 'PRON', 'PRP', 1, 'nsubj'), ('wanted', 'VERB', 'VBD', 1, 'ROOT'),
+                    ('to', 'PART', 'TO', 3, 'aux'), ('go', 'VERB', 'VB', 1, 'xcomp'),
+                    ('home', 'ADV', 'RB', 3, 'advmod')],
+    'missing subject': [('will', 'VERB', 'MD', 1, 'aux'), ('go', 'VERB', 'VB', 1, 'ROOT'),
+                        ('tomorrow', 'NOUN', 'NN', 1, 'npadvmod')],
+    'missing subject ending on verb': [('must', 'VERB', 'MD', 1, 'aux'), ('leave', 'VERB', 'VB', 1, 'ROOT')],
+    'particle without verb head': [('ready', 'ADJ', 'JJ', 0, 'ROOT'), ('to', 'PART', 'TO', 2, 'aux'),
+                                   ('go', 'VERB', 'VB', 0, 'xcomp')],
+    'non modal will': [('i', 'PRON', 'PRP', 2, 'nsubj'), ('will', 'VERB', 'VB', 2, 'aux'),
+                       ('go', 'VERB', 'VB', 2, 'ROOT')],
+    'no auxiliary': [('we', 'PRON', 'PRP', 1, 'nsubj'), ('went', 'VERB', 'VBD', 1, 'ROOT'),
+                     ('home', 'ADV', 'RB', 1, 'advmod')],
+    'ruled out then later verbs': [('he', 'PRON', 'PRP', 2, 'nsubj'), ('will', 'VERB', 'MD', 2, 'aux'),
+                                   ('run', 'VERB', 'VB', 2, 'ROOT'), ('and', 'CCONJ', 'CC', 2, 'cc'),
+                                   ('to', 'PART', 'TO', 5, 'aux'), ('hide', 'VERB', 'VB', 2, 'conj'),
+                                   ('and', 'CCONJ', 'CC', 5, 'cc'), ('eat', 'VERB', 'VB', 5, 'conj')],
+    'no verbs': [('thanks', 'NOUN', 'NNS', 0, 'ROOT'), ('a', 'DET', 'DT', 2, 'det'),
+                 ('lot', 'NOUN', 'NN', 0, 'npadvmod')],
+    'empty': [],
+}
+
+# Words the random parses are made from, as (text, pos, tag)
+random_words = [
+    ('i', 'PRON', 'PRP'), ('we', 'PRON', 'PRP'), ('you', 'PRON', 'PRP'), ('they', 'PRON', 'PRP'),
+    ('what', 'PRON', 'WP'), ('will', 'VERB', 'MD'), ('will', 'VERB', 'VB'), ('must', 'VERB', 'MD'),
+    ('ll', 'VERB', 'MD'), ('would', 'VERB', 'MD'), ('to', 'PART', 'TO'), ('not', 'PART', 'RB'), ('go', 'VERB', 'VB'),
+    ('going', 'VERB', 'VBG'), ('want', 'VERB', 'VBP'), ('wants', 'VERB', 'VBZ'), ('went', 'VERB', 'VBD'),
+    ('seen', 'VERB', 'VBN'), ('do', 'VERB', 'VBP'), ('if', 'SCONJ', 'IN'), ('why', 'ADV', 'WRB'),
+    ('the', 'DET', 'DT'), ('tomorrow', 'NOUN', 'NN'), ('cat', 'NOUN', 'NN'), ('red', 'ADJ', 'JJ'),
+]
+random_dependencies = ['aux', 'aux', 'aux', 'neg', 'nsubj', 'nsubj', 'dobj', 'ccomp', 'acomp', 'xcomp', 'npadvmod',
+                       'det', 'compound', 'poss', 'nmod', 'advmod', 'conj']
+
+
+def make_document(vocab, tokens, parsed=True):
+    """ Document with the given tags (and parse) """
+    document = Doc(vocab, words=[token[0] for token in tokens])
+    if len(tokens) == 0:
+        return document
+
+    # Heads are stored as offsets, negative offsets wrap around (as in Doc.to_array)
+    attributes = [POS, TAG, HEAD, DEP] if parsed else [POS, TAG]
+    values = [
+        [vocab.strings.add(pos), vocab.strings.add(tag), (head - index) % 2 ** 64, vocab.strings.add(dependency)]
+        for index, (_, pos, tag, head, dependency) in enumerate(tokens)
+    ]
+    return document.from_array(attributes, array(values, dtype=uint64)[:, :len(attributes)])
+
+
+def random_parse(generator, length):
+    """ Random projective parse tree (a root with the tokens on each side split into subtrees) """
+    heads = [0] * length
+
+    def attach(start, end, head):
+        while start < end:
+            size = generator.randint(1, end - start)
+            root = generator.randrange(start, start + size)
+            heads[root] = head
+            attach(start, root, root)
+            attach(root + 1, start + size, root)
+            start += size
+
+    root = generator.randrange(length)
+    heads[root] = root
+    attach(0, root, root)
+    attach(root + 1, length, root)
+
+    return [
+        generator.choice(random_words) + (head, 'ROOT' if head == index else generator.choice(random_dependencies))
+        for index, head in enumerate(heads)
+    ]
+
+
+@pytest.fixture
+def vocab(monkeypatch):
+    vocab = spacy.blank('en').vocab
+    monkeypatch.setattr(intent_seed, 'intent_matchers', intent_seed.build_intent_matchers(vocab))
+    return vocab
+
+
+@pytest.mark.parametrize('name', parsed_sentences)
+def test_matcher_rule_matches_rule(vocab, name):
+    document = make_document(vocab, parsed_sentences[name])
+    assert intent_seed.match_basic_intent(document) == intent_seed.identify_basic_intent(document)
+
+
+def test_matcher_rule_decisions(vocab):
+    scores = {name: intent_seed.match_basic_intent(make_document(vocab, tokens))[0]
+              for name, tokens in parsed_sentences.items()}
+
+    assert [name for name, score in scores.items() if score == 1] == [
+        'will', 'short will', 'going to', 'want to', 'double negation', 'second then first person'
+    ]
+    assert scores['negation'] == scores['question'] == scores['third person'] == scores['past desire'] == 0
+    assert scores['missing subject'] == scores['no verbs'] == scores['empty'] == .5
+
+
+def test_matcher_rule_matches_rule_on_random_parses(vocab):
+    generator = Random(0)
+    for _ in range(5000):
+        document = make_document(vocab, random_parse(generator, generator.randint(1, 12)))
+        assert intent_seed.match_basic_intent(document) == intent_seed.identify_basic_intent(document)
+
+
+@pytest.mark.parametrize('name', parsed_sentences)
+def test_unmatched_tags_give_parsed_intent(vocab, name):
+    tagged = make_document(vocab, parsed_sentences[name], parsed=False)
+    auxiliaries = intent_seed.intent_auxiliaries(tagged)
+
+    # Contexts without a matched auxiliary get the same intent from their tags as from their parse
+    if len(auxiliaries) == 0:
+        parsed = make_document(vocab, parsed_sentences[name])
+        assert intent_seed.match_basic_intent(tagged, auxiliaries=auxiliaries) == \
+            intent_seed.identify_basic_intent(parsed)
+
+
+@pytest.fixture(scope='module')
+def parser():
+    if not spacy.util.is_package(intent_seed.model_name):
+        pytest.skip(intent_seed.model_name + ' is not installed')
+
+    intent_seed.worker_init()
+    return intent_seed.parser
+
+
+def test_screen_keeps_intent_data(parser):
+    texts = intent_seed.context_texts(contexts)
+    expected = [intent_seed.identify_basic_intent(parser(text)) for text in texts]
+
+    intent_data, num_skipped, shard = intent_seed.tag_intent_batch(contexts)
+    assert intent_data == expected
+    assert num_skipped > 0
+    assert shard is None
+
+
+def test_screen_matches_unscreened(parser):
+    screened, num_skipped, _ = intent_seed.tag_intent_batch(contexts)
+    unscreened, num_unscreened_skipped, _ = intent_seed.tag_intent_batch(contexts, screen=False)
+    assert screened == unscreened
+    assert num_unscreened_skipped == 0
+
+
+def test_verify_intent_tagging(parser, monkeypatch):
+    assert intent_seed.verify_intent_tagging(contexts, len(contexts)) > 0
+
+    # A screen that skips the parse of every context changes the intent of those with intent
+    monkeypatch.setattr(intent_seed, 'intent_auxiliaries', lambda document: [])
+    with pytest.raises(ValueError):
+        intent_seed.verify_intent_tagging(contexts, len(contexts))
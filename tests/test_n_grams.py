@@ -0,0 +1,33 @@
+from model.extraction.n_grams import compare_n_gram_selection
+from numpy.random import RandomState
+
+random = RandomState(0)
+words = ['word%d' % index for index in range(30)]
+weights = [1 / (rank + 1) for rank in range(30)]
+weights = [weight / sum(weights) for weight in weights]
+contexts = [' '.join(random.choice(words, random.randint(3, 12), p=weights)) for _ in range(2000)]
+
+
+def test_ample_capacity_is_exact():
+    report = compare_n_gram_selection(contexts, 50, 100000, ngram_range=(1, 2))
+
+    assert report['recall'] == 1
+    assert report['identical']
+    assert report['max_estimate_error'] == 0
+
+
+def test_estimate_error_within_bound():
+    report = compare_n_gram_selection(contexts, 20, 60, ngram_range=(1, 3))
+
+    assert 0 < report['max_estimate_error'] <= report['error_bound']
+    assert report['candidates'] <= 60
+    assert report['distinct_n_grams'] > 60
+
+
+def test_selection_exact_above_bound():
+    report = compare_n_gram_selection(contexts, 5, 200, ngram_range=(1, 3))
+
+    # Every n-gram counted more often than the bound is a candidate, so the frequent ones are all selected
+    assert report['cutoff_count'] > report['error_bound']
+    assert report['recall'] == 1
+    assert report['identical']
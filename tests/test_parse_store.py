@@ -0,0 +1,64 @@
+import pytest
+
+spacy = pytest.importorskip('spacy')
+
+from utilities.data_management import parse_store
+from utilities.data_management.parse_store import ParseStore, write_shard, read_documents, shard_paths, lock_suffix
+from os import getppid
+
+texts = ['we will go tomorrow', 'the cat sat', 'i am going to win', 'ok']
+
+
+@pytest.fixture
+def nlp():
+    return spacy.blank('en')
+
+
+def test_unlisted_shard_kept_while_store_held(tmp_path, nlp):
+    store = ParseStore(tmp_path)
+    store.save()
+
+    # Another run (here the parent process) has the store open and has written a shard it hasn't added yet
+    other_lock = tmp_path / (str(getppid()) + lock_suffix)
+    other_lock.touch()
+    shard = write_shard(tmp_path, [nlp(text) for text in texts])
+
+    ParseStore(tmp_path).save()
+    assert all(path.exists() for path in shard_paths(tmp_path, shard))
+
+    # Once that run has ended, its lock is stale and the shard it never added is removed
+    other_lock.unlink()
+    store = ParseStore(tmp_path)
+    assert not any(path.exists() for path in shard_paths(tmp_path, shard))
+
+    store.save()
+    assert list(tmp_path.glob('*' + lock_suffix)) == []
+
+
+def test_stale_lock_removed(tmp_path, nlp):
+    stale_lock = tmp_path / ('999999999' + lock_suffix)
+    stale_lock.touch()
+    shard = write_shard(tmp_path, [nlp(text) for text in texts])
+
+    ParseStore(tmp_path).save()
+    assert not stale_lock.exists()
+    assert not any(path.exists() for path in shard_paths(tmp_path, shard))
+
+
+def test_shard_decoded_once(tmp_path, nlp, monkeypatch):
+    store = ParseStore(tmp_path)
+    shard = write_shard(tmp_path, [nlp(text) for text in texts])
+    store.add(shard)
+
+    decoded = []
+    doc_bin = parse_store.DocBin
+    monkeypatch.setattr(parse_store, 'DocBin', lambda *args, **kwargs: decoded.append(shard) or doc_bin(*args, **kwargs))
+
+    # Chunks that share a shard only decode it once
+    locations = store.locate(texts)
+    first = read_documents(tmp_path, locations[:2], nlp.vocab)
+    second = read_documents(tmp_path, locations[::-1], nlp.vocab)
+
+    assert [document.text for document in first] == texts[:2]
+    assert [document.text for document in second] == texts[::-1]
+    assert len(decoded) == 1
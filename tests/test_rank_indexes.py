@@ -0,0 +1,33 @@
+from utilities.analysis import rank_indexes
+from numpy import argsort, flip, array_equal, clip, float32, sort
+from numpy.random import RandomState
+import pytest
+
+random = RandomState(0)
+inputs = {
+    'unique': random.permutation(5000).astype(float),
+    'few values': random.randint(0, 5, 5000),
+    'saturated': clip(random.normal(.5, 1, 5000), 0, 1).astype(float32),
+    'constant': random.rand(1).repeat(5000),
+    'ties at the ends': clip(random.randint(-20, 21, 5000), -3, 3) * .5,
+}
+
+
+@pytest.mark.parametrize('name', inputs)
+@pytest.mark.parametrize('k', [None, 0, 1, 2, 10, 999, 2500, 4999, 5000, 6000])
+def test_matches_argsort(name, k):
+    values = inputs[name]
+    expected_smallest = argsort(values)[:k]
+    expected_largest = flip(argsort(values))[:k]
+
+    assert array_equal(rank_indexes(values, k), expected_smallest)
+    assert array_equal(rank_indexes(values, k, largest=True), expected_largest)
+
+
+@pytest.mark.parametrize('name', inputs)
+@pytest.mark.parametrize('k', [1, 10, 999, 2500, 4999])
+def test_unordered_matches_argsort_selection(name, k):
+    values = inputs[name]
+
+    assert array_equal(sort(rank_indexes(values, k, ordered=False)), sort(argsort(values)[:k]))
+    assert array_equal(sort(rank_indexes(values, k, largest=True, ordered=False)), sort(flip(argsort(values))[:k]))
@@ -0,0 +1,57 @@
+from utilities.pre_processing import VocabularyIndex, token_to_index
+from numpy import zeros, array_equal
+from numpy.random import RandomState
+import pytest
+
+max_tokens = 8
+random = RandomState(0)
+words = ['w%d' % index for index in range(50)] + ['']
+documents = [' '.join(random.choice(words, random.randint(0, 2 * max_tokens))) for _ in range(500)]
+documents += ['', ' leading', 'trailing ', 'double  space', ' '.join(['x'] * max_tokens) + ' y', None]
+embedding_tokens = words[5:] + ['w10', 'x']     # Missing tokens and a repeated token (its last index is kept)
+
+
+def reference_token_to_index(raw_documents, tokens, keep_null=False):
+    """ Original token by token loop of token_to_index """
+    token_mapping = {token: index for index, token in enumerate(tokens)}
+    doc_arrays = zeros((len(raw_documents), max_tokens), dtype=int)
+    for index, document in enumerate(raw_documents):
+        if not isinstance(document, str): continue
+
+        indexed_document = []
+        for token_index, token in enumerate(document.split(' ')):
+            if token_index > max_tokens: break
+            if len(token) == 0 and not keep_null: continue
+            elif token in token_mapping:
+                indexed_document.append(token_mapping[token])
+
+        num_tokens = min([max_tokens, len(indexed_document)])
+        doc_arrays[index, :num_tokens] = indexed_document[:num_tokens]
+
+    return doc_arrays
+
+
+@pytest.mark.parametrize('keep_null', [False, True])
+def test_encode_matches_loop(keep_null):
+    vocabulary = VocabularyIndex.from_tokens(embedding_tokens)
+    encoded = vocabulary.encode(documents, max_tokens, keep_null=keep_null)
+
+    assert encoded.dtype == vocabulary.dtype
+    assert array_equal(encoded, reference_token_to_index(documents, embedding_tokens, keep_null))
+
+
+def test_saved_index_encodes_the_same(tmp_path):
+    vocabulary = VocabularyIndex.from_tokens(embedding_tokens)
+    vocabulary.save(tmp_path / 'vocabulary.npz')
+    loaded = VocabularyIndex.load(tmp_path / 'vocabulary.npz')
+
+    assert len(loaded) == len(vocabulary) and loaded.mapping == vocabulary.mapping
+    assert array_equal(loaded.encode(documents, max_tokens), vocabulary.encode(documents, max_tokens))
+
+
+def test_token_to_index_mapping(monkeypatch):
+    monkeypatch.setattr('config.max_tokens', max_tokens)
+    doc_arrays, mapping = token_to_index(documents, embedding_tokens, return_mapping=True)
+
+    assert array_equal(doc_arrays, reference_token_to_index(documents, embedding_tokens))
+    assert mapping == {token: index for index, token in enumerate(embedding_tokens)}
@@ -1,4 +1,4 @@
-from numpy import where, min, max, std, mean, percentile, array
+from numpy import where, min, max, std, mean, percentile, array, asarray, argsort, flip, partition, empty, int64, diff
 from sklearn.metrics import log_loss
 
 
@@ -13,6 +13,43 @@ def calculate_loss(predictions, labels, threshold):
     return log_loss(labels, thresh_preds)
 
 
+def rank_indexes(values, k=None, largest=False, ordered=True):
+    """
+    Indexes of the k smallest (or largest) values in order. Gives the same result as argsort(values)[:k] (or flipped
+    for the largest), but when the selected values are unique only they are sorted. The order of tied values depends on
+    the sort of the whole array, so a selection with ties falls back to the full sort (unordered selections only fall
+    back when the k-th value is tied with an unselected one).
+    NOTE: Assumes the values contain no nan
+
+    :param ndarray values: Values to rank
+    :param int k: Number of indexes to select, (default every index)
+    :param bool largest: Whether to select the largest values, (default smallest)
+    :param bool ordered: Whether the indexes must be in order, rather than only the same set, (default True)
+    :return ndarray: Indexes of the selected values, in order
+    """
+    values = asarray(values)
+    if k is not None and k <= 0:
+        return empty(0, int64)
+
+    if k is not None and k < len(values):
+        # Find the k-th value, then select it and every value past it
+        kth = len(values) - k if largest else k - 1
+        boundary = partition(values, kth)[kth]
+        [indexes] = where(values >= boundary if largest else values <= boundary)
+
+        # Without ties at the k-th value the selection doesn't depend on the sort, nor does its order without any ties
+        if len(indexes) == k:
+            if not ordered:
+                return indexes
+
+            order = indexes[argsort(values[indexes])]
+            if (diff(values[order]) != 0).all():
+                return flip(order) if largest else order
+
+    order = argsort(values)
+    return flip(order)[:k] if largest else order[:k]
+
+
 def length_stats(lengths):
     is_2d = type(lengths[0]) is list
 
@@ -3,5 +3,8 @@ from utilities.data_management.handling import *
 from utilities.data_management.file_management import *
 from utilities.data_management.preparation import *
 from utilities.data_management.generators import *
+from utilities.data_management.checkpoints import *
+from utilities.data_management.intent_frames import *
+from utilities.data_management.sequence_matrix import *
 
 move_to_root()
@@ -0,0 +1,189 @@
+from utilities.data_management.io import make_path
+from io import StringIO
+from json import load, dump
+from hashlib import md5
+from os import replace
+from shutil import copyfileobj, rmtree
+from pandas import read_csv
+
+manifest_name = 'manifest.json'
+header_name = 'header.csv'
+shard_template = 'shard_%05d.csv'
+
+
+def read_csv_chunks(file, chunk_size, encoding=None, start=None, max_documents=None):
+    """
+    Reads a CSV file in chunks of rows, keeping track of the file position of each chunk so reading can be resumed.
+    NOTE: Assumes standard CSV quoting, where quotes within a field are doubled
+
+    :param file: Path to the CSV file
+    :param int chunk_size: Number of rows per chunk
+    :param str encoding: Encoding of the file, (default None)
+    :param int start: File position to start reading from (after the header), (default start of file)
+    :param int max_documents: Maximum number of rows to read, (default entire file)
+    :return: Generator of chunk DataFrame, chunk start position, and chunk end position
+    """
+    path = make_path(file)
+    remaining = max_documents
+
+    with path.open(mode='r', encoding=encoding, newline='') as source_file:
+        header = source_file.readline()
+        if start is not None:
+            source_file.seek(start)
+
+        while remaining is None or remaining > 0:
+            chunk_start = source_file.tell()
+            limit = chunk_size if remaining is None else min(chunk_size, remaining)
+
+            # Pull lines until the chunk has enough rows, a row is only complete once all of its quotes are closed
+            lines, num_rows, in_quote = [], 0, False
+            while num_rows < limit:
+                line = source_file.readline()
+                if len(line) == 0:
+                    break
+
+                lines.append(line)
+                if line.count('"') % 2 != 0:
+                    in_quote = not in_quote
+                if not in_quote:
+                    num_rows += 1
+
+            if len(lines) == 0:
+                return
+            if remaining is not None:
+                remaining -= num_rows
+
+            chunk = read_csv(StringIO(header + ''.join(lines)), index_col=0)
+            yield chunk, chunk_start, source_file.tell()
+
+
+def file_checksum(path, block_size=2 ** 20):
+    """ Computes the MD5 checksum of a file """
+    checksum = md5()
+    with make_path(path).open(mode='rb') as fl:
+        for block in iter(lambda: fl.read(block_size), b''):
+            checksum.update(block)
+
+    return checksum.hexdigest()
+
+
+class ShardCheckpoint:
+    """
+    Stores the output of a long-running job as numbered shards alongside a manifest, so an interrupted job can resume
+    from its last complete shard.
+    While a job is in progress its output only exists in the shard directory (i.e. [dest name]_shards/), the
+    destination file is written when the shards are concatenated at the end.
+    """
+    def __init__(self, dest_path, source_path):
+        self.dest_path = make_path(dest_path)
+        self.source_path = make_path(source_path)
+
+        self.directory = self.dest_path.parent / (self.dest_path.stem + '_shards')
+        self.manifest_path = self.directory / manifest_name
+        self.header_path = self.directory / header_name
+        self.shards = []
+
+    def shard_path(self, index=None):
+        """ Path of a shard, by default the next shard to be written """
+        index = len(self.shards) if index is None else index
+        return self.directory / (shard_template % index)
+
+    def load_manifest(self):
+        """ Loads the manifest, returns None if it does not exist or belongs to a different source file """
+        if not self.manifest_path.exists():
+            return None
+
+        with self.manifest_path.open(mode='r') as fl:
+            manifest = load(fl)
+
+        if manifest['source'] != str(self.source_path) or manifest['source_size'] != self.source_path.stat().st_size:
+            return None
+        return manifest
+
+    def save_manifest(self):
+        """ Saves the manifest, written to a temporary file first so an interruption can't corrupt it """
+        manifest = {
+            'source': str(self.source_path),
+            'source_size': self.source_path.stat().st_size,
+            'shards': self.shards
+        }
+
+        temp_path = self.directory / (manifest_name + '.tmp')
+        with temp_path.open(mode='w') as fl:
+            dump(manifest, fl, indent=1)
+        replace(temp_path, self.manifest_path)
+
+    def load_shards(self):
+        """
+        Loads the shards listed in the manifest, keeping those before the first missing or corrupt shard
+
+        :return int: Number of shards loaded
+        """
+        self.directory.mkdir(exist_ok=True)
+        manifest = self.load_manifest()
+
+        self.shards = []
+        if manifest is not None:
+            for index, shard in enumerate(manifest['shards']):
+                path = self.shard_path(index)
+                if not path.exists() or file_checksum(path) != shard['checksum']:
+                    break
+                self.shards.append(shard)
+
+        return len(self.shards)
+
+    def truncate(self, num_shards):
+        """
+        Drops all but the first num_shards shards (ex. to line up with another checkpoint of the same source)
+
+        :return tuple: File position in the source to resume from (None if starting fresh) and number of source rows done
+        """
+        self.shards = self.shards[:num_shards]
+        self.save_manifest()
+
+        if len(self.shards) == 0:
+            return None, 0
+
+        last_shard = self.shards[-1]
+        print('Resuming', self.dest_path.name, 'from shard', len(self.shards), 'at row',
+              last_shard['row_offset'] + last_shard['rows'])
+        return last_shard['end'], last_shard['row_offset'] + last_shard['rows']
+
+    def resume(self):
+        """
+        Loads the existing shards, keeping those before the first missing or corrupt shard
+
+        :return tuple: File position in the source to resume from (None if starting fresh) and number of source rows done
+        """
+        return self.truncate(self.load_shards())
+
+    def add_shard(self, start, end, num_rows):
+        """
+        Records the most recently written shard (at shard_path()) in the manifest
+
+        :param int start: Position in the source file where the shard's input starts
+        :param int end: Position in the source file where the shard's input ends
+        :param int num_rows: Number of source rows processed into the shard
+        """
+        row_offset = self.shards[-1]['row_offset'] + self.shards[-1]['rows'] if len(self.shards) > 0 else 0
+
+        self.shards.append({
+            'start': start,
+            'end': end,
+            'row_offset': row_offset,
+            'rows': num_rows,
+            'checksum': file_checksum(self.shard_path())
+        })
+        self.save_manifest()
+
+    def finalize(self):
+        """ Concatenates the header and shards into the destination file, then removes the shards """
+        temp_path = self.dest_path.parent / (self.dest_path.name + '.tmp')
+
+        with temp_path.open(mode='wb') as dest_file:
+            for path in [self.header_path] + [self.shard_path(index) for index in range(len(self.shards))]:
+                with path.open(mode='rb') as shard_file:
+                    copyfileobj(shard_file, dest_file)
+
+        replace(temp_path, self.dest_path)
+        rmtree(self.directory)
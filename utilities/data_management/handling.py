@@ -1,7 +1,7 @@
-from pandas import DataFrame, Series
+from pandas import DataFrame, Series, factorize
 # from scipy.special import digamma
 from scipy.sparse import csr_matrix
-from numpy import float64, array, ndarray, asarray
+from numpy import float64, array, ndarray, asarray, concatenate
 from sklearn.preprocessing import LabelEncoder
 from utilities.analysis import normalize_embeddings
 
@@ -147,3 +147,26 @@ def split_embeddings(raw_embeddings, normalize=True):
         vectors = normalize_embeddings(vectors)
 
     return tokens, vectors
+
+
+def deduplicate(values, name='values'):
+    """
+    Finds the unique values (in order of first appearance) so a costly stage only has to process each value once, its
+    results are expanded back to the original order with results[inverse]
+
+    :param values: Values to deduplicate (ex. cleaned contexts)
+    :param str name: Name of the values in the duplication report, (default values)
+    :return tuple[ndarray, ndarray]: Unique values and the index of each value in the unique values
+    """
+    values = asarray(values if isinstance(values, (list, ndarray)) else list(values), dtype=object)
+    inverse, unique = factorize(values)
+
+    # Missing values (ex. nan or None) aren't factorized, keep them as one more unique value
+    missing = inverse < 0
+    if missing.any():
+        inverse[missing] = len(unique)
+        unique = concatenate([asarray(unique, dtype=object), values[missing][:1]])
+
+    duplication_ratio = 1 - len(unique) / len(values) if len(values) > 0 else 0
+    print(len(unique), 'of', len(values), name, 'are unique (duplication ratio %.3f)' % duplication_ratio)
+    return asarray(unique, dtype=object), inverse
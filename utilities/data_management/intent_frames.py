@@ -0,0 +1,194 @@
+from utilities.data_management.io import make_path
+from pandas import factorize
+from numpy import asarray, append, concatenate, cumsum, diff, zeros, full, arange, repeat, bincount, lexsort, isin, \
+    unique, float32, int32, int64, savez_compressed, load
+
+# Columns of an intent frame (in the order of the rows from identify_basic_intent, without the score)
+verb_columns = ['source', 'desire', 'action']
+relation_columns = ['target', 'timing']
+frame_columns = verb_columns + relation_columns + ['index']
+
+
+def parse_relation(relation):
+    """ Token indexes of a relation from assemble_related_information (ex. '"3,4"'), empty if there is no relation """
+    if relation is None or relation != relation:
+        return []
+    return [int(index) for index in relation.strip('"').split(',')]
+
+
+def format_relation(indexes):
+    """ Inverse of parse_relation """
+    return '"' + ','.join(str(index) for index in indexes) + '"' if len(indexes) > 0 else None
+
+
+class IntentFrames:
+    """
+    Columnar store of intent frames and their rough label (score).
+    Source, desire, and action verbs are dictionary encoded (code -1 for missing), so they can be compared as integers,
+    while the token indexes of the target and timing relations are packed into a single array with row offsets.
+    """
+    def __init__(self, scores, verbs, relations, indexes):
+        """
+        :param ndarray scores: Rough label of each context
+        :param dict verbs: Codes and categories of each verb column
+        :param dict relations: Offsets and packed token indexes of each relation column
+        :param ndarray indexes: Index of each context
+        """
+        self.scores = asarray(scores, dtype=float32)
+        self.verbs = verbs
+        self.relations = relations
+        self.indexes = asarray(indexes, dtype=int32)
+
+    @classmethod
+    def from_rows(cls, scores, rows):
+        """
+        Builds the frames from rows of (source, desire, action, target, timing, index) like tag_intent_documents makes
+
+        :param ndarray scores: Rough label of each context
+        :param ndarray rows: Intent frame of each context
+        """
+        rows = asarray(rows, dtype=object).reshape(-1, len(frame_columns))
+
+        verbs = {}
+        for column in verb_columns:
+            values = rows[:, frame_columns.index(column)]
+            codes, categories = factorize(values)
+            verbs[column] = (codes.astype(int32), asarray(categories, dtype=str))
+
+        relations = {}
+        for column in relation_columns:
+            parsed = [parse_relation(relation) for relation in rows[:, frame_columns.index(column)]]
+            offsets = concatenate([[0], cumsum([len(indexes) for indexes in parsed], dtype=int64)])
+            values = asarray([index for indexes in parsed for index in indexes], dtype=int32)
+            relations[column] = (offsets, values)
+
+        return cls(scores, verbs, relations, rows[:, frame_columns.index('index')].astype(int32))
+
+    @classmethod
+    def empty(cls, num_frames, score=0.):
+        """ Frames without verbs or relations (ex. for contexts that aren't tagged) """
+        verbs = {column: (full(num_frames, -1, dtype=int32), asarray([], dtype=str)) for column in verb_columns}
+        relations = {
+            column: (zeros(num_frames + 1, dtype=int64), asarray([], dtype=int32)) for column in relation_columns
+        }
+
+        return cls(full(num_frames, score), verbs, relations, full(num_frames, -1))
+
+    @classmethod
+    def join(cls, frames):
+        """ Joins the rows of several sets of frames """
+        verbs = {}
+        for column in verb_columns:
+            categories = concatenate([frame.verbs[column][1] for frame in frames])
+            codes, merged = factorize(categories)
+
+            # Re-map each frame's codes onto the merged categories (-1 stays missing)
+            all_codes, start = [], 0
+            for frame in frames:
+                frame_codes, frame_categories = frame.verbs[column]
+                mapping = append(codes[start:start + len(frame_categories)], -1)
+                all_codes.append(mapping[frame_codes])
+                start += len(frame_categories)
+
+            verbs[column] = (concatenate(all_codes).astype(int32), asarray(merged, dtype=str))
+
+        relations = {}
+        for column in relation_columns:
+            lengths = concatenate([diff(frame.relations[column][0]) for frame in frames])
+            offsets = concatenate([[0], cumsum(lengths, dtype=int64)])
+            relations[column] = (offsets, concatenate([frame.relations[column][1] for frame in frames]))
+
+        return cls(concatenate([frame.scores for frame in frames]), verbs, relations,
+                   concatenate([frame.indexes for frame in frames]))
+
+    def __len__(self):
+        return len(self.scores)
+
+    def take(self, rows):
+        """ Frames of the given rows, in the given order (ex. a shuffle pattern) """
+        rows = asarray(rows)
+        verbs = {column: (codes[rows], categories) for column, (codes, categories) in self.verbs.items()}
+
+        relations = {}
+        for column, (offsets, values) in self.relations.items():
+            lengths = diff(offsets)[rows]
+            new_offsets = concatenate([[0], cumsum(lengths, dtype=int64)])
+
+            # Position of each packed value in the original values, i.e. each row's start plus the position in its row
+            positions = repeat(offsets[rows] - new_offsets[:-1], lengths) + arange(new_offsets[-1])
+            relations[column] = (new_offsets, values[positions])
+
+        return IntentFrames(self.scores[rows], verbs, relations, self.indexes[rows])
+
+    def verb_column(self, column):
+        """ Verb of each row (None where missing) """
+        codes, categories = self.verbs[column]
+        return append(categories.astype(object), None)[codes]
+
+    def relation_column(self, column):
+        """ Relation of each row in the form assemble_related_information makes (None where missing) """
+        offsets, values = self.relations[column]
+        return asarray([format_relation(values[start:end]) for start, end in zip(offsets[:-1], offsets[1:])],
+                       dtype=object)
+
+    def to_rows(self):
+        """ Frames as an object array of rows, like tag_intent_documents makes """
+        columns = [self.verb_column(column) for column in verb_columns] + \
+                  [self.relation_column(column) for column in relation_columns] + [self.indexes.astype(object)]
+        return asarray(columns, dtype=object).transpose()
+
+    def verb_codes(self, column, verbs):
+        """ Codes of the given verbs in a verb column (verbs that never appear are left out) """
+        codes, categories = self.verbs[column]
+        return arange(len(categories))[isin(categories, list(verbs))]
+
+    def contains_verb(self, column, verbs):
+        """ Mask of the rows whose verb (in the given column) is one of the given verbs """
+        return isin(self.verbs[column][0], self.verb_codes(column, verbs))
+
+    def map_verbs(self, column, mapping):
+        """
+        Replaces verbs of a column according to a mapping (ex. spaCy truncations, gon -> going)
+
+        :return int: Number of rows that changed
+        """
+        codes, categories = self.verbs[column]
+        changed = self.verb_codes(column, mapping.keys())
+        mapped_codes, mapped = factorize(asarray([mapping.get(verb, verb) for verb in categories], dtype=object))
+
+        self.verbs[column] = (append(mapped_codes, -1)[codes].astype(int32), asarray(mapped, dtype=str))
+        return int(isin(codes, changed).sum())
+
+    def verb_counts(self, column):
+        """
+        Verbs of a column ordered by decreasing usage (ties in order of first use)
+
+        :return tuple[ndarray, ndarray]: Verbs and their counts
+        """
+        codes, categories = self.verbs[column]
+        used = codes[codes >= 0]
+        counts = bincount(used, minlength=len(categories))
+
+        present, first_use = unique(used, return_index=True)
+        order = present[lexsort((first_use, -counts[present]))]
+        return categories[order], counts[order]
+
+    def save(self, path):
+        """ Saves the frames to a (compressed) numpy archive """
+        columns = {'scores': self.scores, 'indexes': self.indexes}
+        for column, (codes, categories) in self.verbs.items():
+            columns[column + '_codes'], columns[column + '_categories'] = codes, categories
+        for column, (offsets, values) in self.relations.items():
+            columns[column + '_offsets'], columns[column + '_values'] = offsets, values
+
+        savez_compressed(make_path(path), **columns)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads frames saved with save """
+        with load(make_path(path)) as columns:
+            verbs = {column: (columns[column + '_codes'], columns[column + '_categories']) for column in verb_columns}
+            relations = {
+                column: (columns[column + '_offsets'], columns[column + '_values']) for column in relation_columns
+            }
+            return cls(columns['scores'], verbs, relations, columns['indexes'])
@@ -0,0 +1,270 @@
+from utilities.data_management.io import make_path
+from spacy.tokens import DocBin
+from spacy.util import get_package_path, get_model_meta
+from pathlib import Path
+from hashlib import blake2b
+from json import load, dump
+from os import replace, getpid, kill
+from collections import OrderedDict
+from time import time
+from uuid import uuid4
+from numpy import frombuffer, uint8, load as load_array, save as save_array
+
+store_root = Path('data/processed_data/parse_store')
+manifest_name = 'manifest.json'
+shard_suffix = '.spacy'
+key_suffix = '.keys.npy'
+lock_suffix = '.lock'
+key_size = 16
+cached_shards = 2           # Decoded shards each process keeps (chunks of a later run mostly map to the same shards)
+
+# Token attributes kept for each parse (the text and whitespace are always kept)
+stored_attributes = ['TAG', 'POS', 'HEAD', 'DEP']
+
+shard_cache = OrderedDict()     # (Vocabulary, directory, shard) -> decoded documents, least recently used first
+
+
+def text_key(text):
+    """ Content hash a parse is stored under """
+    return blake2b(text.encode('utf8'), digest_size=key_size).digest()
+
+
+def store_directory(model_name, disabled=(), root=store_root):
+    """
+    Directory of the parse store for a spaCy model, parses from other versions or components of the model are kept apart
+
+    :param str model_name: Name of the spaCy model (ex. en_core_web_sm)
+    :param disabled: Components disabled when the model was loaded, (default none)
+    :param root: Directory holding the stores of every model, (default data/processed_data/parse_store)
+    """
+    name = '%s-%s' % (model_name, get_model_meta(get_package_path(model_name))['version'])
+    if len(disabled) > 0:
+        name += '_without-' + '-'.join(sorted(disabled))
+
+    return make_path(root) / name
+
+
+def shard_paths(directory, shard):
+    """ Paths of a shard's parses and keys """
+    directory = make_path(directory)
+    return directory / (shard + shard_suffix), directory / (shard + key_suffix)
+
+
+def write_shard(directory, documents):
+    """
+    Saves parsed documents to a new shard, the shard is only used once it has been added to the store
+
+    :param directory: Directory of the store
+    :param list documents: Parsed spaCy documents
+    :return str: Name of the shard
+    """
+    shard = uuid4().hex
+    documents_path, keys_path = shard_paths(directory, shard)
+
+    shard_data = DocBin(attrs=stored_attributes)
+    for document in documents:
+        shard_data.add(document)
+    documents_path.write_bytes(shard_data.to_bytes())
+
+    keys = b''.join(text_key(document.text) for document in documents)
+    save_array(str(keys_path), frombuffer(keys, dtype=uint8).reshape(-1, key_size))
+
+    return shard
+
+
+def decode_shard(directory, shard, vocab):
+    """ Documents of a shard, recently decoded shards are kept so chunks that share a shard only decode it once """
+    key = (id(vocab), str(directory), shard)
+    if key in shard_cache:
+        shard_cache.move_to_end(key)
+        return shard_cache[key]
+
+    documents_path, _ = shard_paths(directory, shard)
+    documents = list(DocBin().from_bytes(documents_path.read_bytes()).get_docs(vocab))
+
+    shard_cache[key] = documents
+    while len(shard_cache) > cached_shards:
+        shard_cache.popitem(last=False)
+
+    return documents
+
+
+def read_documents(directory, locations, vocab):
+    """
+    Loads stored parses
+
+    :param directory: Directory of the store
+    :param list locations: Shard and position of each parse
+    :param vocab: Vocabulary of the model that made the parses
+    :return list: Parsed documents, in the order of their locations
+    """
+    by_shard = {}
+    for index, (shard, position) in enumerate(locations):
+        by_shard.setdefault(shard, []).append((index, position))
+
+    documents = [None] * len(locations)
+    for shard, positions in by_shard.items():
+        shard_documents = decode_shard(directory, shard, vocab)
+        for index, position in positions:
+            documents[index] = shard_documents[position]
+
+    return documents
+
+
+def parse_stored(directory, texts, locations, parse, vocab):
+    """
+    Parses texts, loading the parses that are already stored and saving the rest to a new shard
+
+    :param directory: Directory of the store
+    :param list texts: Texts (or tokenized documents) to parse
+    :param list locations: Shard and position of each text's stored parse (None if it isn't stored)
+    :param parse: Function that parses an iterable of texts
+    :param vocab: Vocabulary of the model
+    :return tuple[list, str]: Parsed documents and the name of the new shard (None if nothing was parsed)
+    """
+    parsed = list(parse(text for text, location in zip(texts, locations) if location is None))
+    stored = iter(read_documents(directory, [location for location in locations if location is not None], vocab))
+
+    new = iter(parsed)
+    documents = [next(new) if location is None else next(stored) for location in locations]
+    shard = write_shard(directory, parsed) if len(parsed) > 0 else None
+
+    return documents, shard
+
+
+class ParseStore:
+    """
+    On-disk store of spaCy parses keyed by a hash of their text, so unchanged texts aren't parsed again on later runs.
+    Parses are saved in shards (spaCy DocBin files with an array of their keys), which are listed in the manifest.
+    Shards are written by whichever process parsed the texts (see parse_stored), but only the process that owns the
+    store adds them to the manifest or evicts them.
+    Each open store holds a lock file (named after its process id) until it is saved, shards that aren't listed are only
+    removed when no other run holds the store, as they may have been written but not yet added by that run.
+    NOTE: When the store is over its size limit, the least recently used shards are evicted
+    """
+    def __init__(self, directory, max_bytes=None):
+        self.directory = make_path(directory)
+        self.max_bytes = max_bytes
+        self.manifest_path = self.directory / manifest_name
+        self.lock_path = self.directory / (str(getpid()) + lock_suffix)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock_path.touch()
+        self.shards = self.load_manifest()
+        if not self.held_elsewhere():
+            self.remove_unlisted()
+
+        self.index = {}
+        for shard in self.shards:
+            self.index_shard(shard)
+
+    def load_manifest(self):
+        """ Loads the shard records (size and last use of each shard) """
+        if not self.manifest_path.exists():
+            return {}
+
+        with self.manifest_path.open(mode='r') as fl:
+            return load(fl)['shards']
+
+    def save(self):
+        """
+        Evicts shards over the size limit, then saves the manifest (written to a temporary file first) and releases the
+        store's lock
+        """
+        self.evict()
+
+        temp_path = self.directory / (manifest_name + '.tmp')
+        with temp_path.open(mode='w') as fl:
+            dump({'shards': self.shards}, fl, indent=1)
+        replace(temp_path, self.manifest_path)
+
+        if self.lock_path.exists():
+            self.lock_path.unlink()
+
+    def held_elsewhere(self):
+        """ Whether another running process has the store open, lock files left by processes that ended are removed """
+        held = False
+        for path in self.directory.glob('*' + lock_suffix):
+            if path == self.lock_path:
+                continue
+
+            try:
+                kill(int(path.name[:-len(lock_suffix)]), 0)
+                held = True
+            except PermissionError:     # Running under another user
+                held = True
+            except ProcessLookupError:
+                try:
+                    path.unlink()
+                except FileNotFoundError:   # Removed by another run
+                    pass
+            except ValueError:          # Not a process id
+                continue
+
+        return held
+
+    def remove_unlisted(self):
+        """ Removes shard files that were never added (ex. from an interrupted run) """
+        for path in self.directory.iterdir():
+            shard = path.name.split('.')[0]
+            is_shard_file = path.name.endswith(shard_suffix) or path.name.endswith(key_suffix)
+            if is_shard_file and shard not in self.shards:
+                path.unlink()
+
+    def shard_keys(self, shard):
+        """ Keys of a shard's parses, in the order they are stored """
+        _, keys_path = shard_paths(self.directory, shard)
+        return [key.tobytes() for key in load_array(str(keys_path))]
+
+    def index_shard(self, shard):
+        for position, key in enumerate(self.shard_keys(shard)):
+            self.index[key] = (shard, position)
+
+    def locate(self, texts):
+        """
+        Finds the stored parse of each text
+
+        :param texts: Texts to find
+        :return list: Shard and position of each text's parse (None if it isn't stored)
+        """
+        locations = [self.index.get(text_key(text)) for text in texts]
+
+        now = time()
+        for location in locations:
+            if location is not None:
+                self.shards[location[0]]['last_used'] = now
+
+        return locations
+
+    def add(self, shard):
+        """ Adds a shard written by write_shard to the store """
+        documents_path, keys_path = shard_paths(self.directory, shard)
+        self.shards[shard] = {
+            'size': documents_path.stat().st_size + keys_path.stat().st_size,
+            'last_used': time()
+        }
+        self.index_shard(shard)
+
+    def size(self):
+        """ Total size of the stored shards (in bytes) """
+        return sum(record['size'] for record in self.shards.values())
+
+    def evict(self):
+        """ Removes the least recently used shards until the store is within its size limit """
+        if self.max_bytes is None:
+            return
+
+        by_use = sorted(self.shards, key=lambda _shard: self.shards[_shard]['last_used'])
+        size = self.size()
+        for shard in by_use:
+            if size <= self.max_bytes:
+                break
+
+            for key in self.shard_keys(shard):
+                if self.index.get(key, (None,))[0] == shard:
+                    del self.index[key]
+            for path in shard_paths(self.directory, shard):
+                path.unlink()
+
+            size -= self.shards.pop(shard)['size']
+            print('Evicted parse shard', shard)
@@ -0,0 +1,33 @@
+from scipy.sparse import csr_matrix
+from numpy import asarray
+
+
+class SequenceMatrix:
+    """
+    Sparse sequence-context matrix kept in both row (CSR) and column (CSC) form, so it is only converted once.
+    Class counts are computed as matrix-vector products rather than by selecting the rows of each class.
+    """
+    def __init__(self, matrix):
+        """
+        :param matrix: Sparse sequence-context matrix (contexts x sequences)
+        """
+        self.csr = csr_matrix(matrix)
+        self.csc = self.csr.tocsc()
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    def class_counts(self, mask):
+        """
+        Number of times each sequence occurs in the contexts under a mask
+
+        :param ndarray mask: Mask (or weight) of each context
+        :return ndarray: Count of each sequence
+        """
+        indicator = asarray(mask).astype(self.csr.dtype)
+        return self.csc.transpose().dot(indicator)
+
+    def columns(self, indexes):
+        """ CSC matrix of the given sequence columns, in the given order """
+        return self.csc[:, indexes]
@@ -8,3 +8,4 @@ from utilities.pre_processing.alternates import *
 from utilities.pre_processing.dask_process import *
 from utilities.pre_processing.html_formatting import *
 from utilities.pre_processing.runtime_processing import *
+from utilities.pre_processing.pipeline import *
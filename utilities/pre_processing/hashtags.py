@@ -5,16 +5,18 @@ hashtag_regex = compile(r'#[a-zA-Z0-9_]+')
 hashtag_parser_regex = compile(r'[a-z]+|[A-Z][a-z]+|[A-Z]+(?![a-z])|\d+')
 
 
+def expand_hashtag(match):
+    """ Splits a matched hashtag into its (lowercase) component words """
+    hashtag = match.group(0)
+    bits = [bit.lower() for bit in findall(hashtag_parser_regex, hashtag)]
+
+    return ' '.join(bits)
+
+
 def split_hashtags(document, get_header=False):
     """ Identifies hashtags and splits them, where possible """
     if get_header: return 'hashtag_count'
 
-    def replace(_match):
-        hashtag = _match.group(0)
-        bits = [bit.lower() for bit in findall(hashtag_parser_regex, hashtag)]
-
-        return ' '.join(bits)
-
-    document, num_hashtags = subn(hashtag_regex, replace, document)
+    document, num_hashtags = subn(hashtag_regex, expand_hashtag, document)
 
     return num_hashtags, document
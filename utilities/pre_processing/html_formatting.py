@@ -1,22 +1,100 @@
-from bs4 import BeautifulSoup
-from warnings import filterwarnings
+from re import compile, IGNORECASE, DOTALL
+from html import unescape
 
-# Stop beautiful soup from throwing warnings about url-like text
-filterwarnings("ignore", category=UserWarning, module='bs4')
+# Matches start and end tags, capturing whether it is an end tag, the tag name, and the start tag's attributes.
+# Comments, CDATA sections, declarations, processing instructions, and script/style elements are matched first (and
+# left uncaptured) so tags within them are skipped, as an HTML parser treats their content as text
+tag_regex = compile(
+    r'<!--.*?(?:-->|$)|<!\[CDATA\[.*?(?:\]\]>|$)|<[!?][^>]*>|<(?P<raw>script|style)\b[^>]*>.*?(?:</(?P=raw)\s*>|$)|'
+    r'<(?P<end>/?)(?P<name>[a-zA-Z][^\s/>]*)(?P<attributes>[^>]*)>',
+    IGNORECASE | DOTALL
+)
+div_regex = compile(r'<div[\s/>]', IGNORECASE)
+attribute_regex = compile(r'([^\s=/>]+)(?:\s*=\s*(\'[^\']*\'|"[^"]*"|[^\s>]+))?')
+
+# Elements that never have content, closed as soon as they are opened
+void_elements = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+}
+
+# Attribute values (after un-escaping) that mark a div as a quote or a quote's citation
+quote_style = 'margin:20px; margin-top:5px; '
+citation_align = 'right'
+
+
+def parse_attributes(attribute_text):
+    """ Parses the attributes of an HTML start tag into a dictionary (last value wins for duplicates) """
+    attributes = {}
+    for name, value in attribute_regex.findall(attribute_text):
+        if value[:1] in {'\'', '"'}:
+            value = value[1:-1]
+        attributes[name.lower()] = unescape(value)
+
+    return attributes
 
 
 def remove_quotes(document, get_header=False):
-    """ Removes quotes from (primarily) storm-front content """
+    """
+    Removes quotes from (primarily) storm-front content
+
+    Tags are tracked with a stack of open elements (an end tag closes everything opened since its start tag), each
+    quote (or citation) div is cut out of the raw document along with everything nested in it. Tags within comments,
+    declarations, and script or style elements are skipped.
+    Unlike parsing the document into a DOM, the rest of the markup is left as is.
+    """
     if get_header: return 'quotes'
-    soup = BeautifulSoup(document, 'html.parser')
 
-    quotes = soup.find_all('div', {'style': 'margin:20px; margin-top:5px; '})
-    quote_citation = soup.find_all('div', {'align': 'right'})
+    if div_regex.search(document) is None:     # Fast path, a document without divs can't contain quotes
+        return 0, document
+
+    count, open_tags = 0, []
+    removal_start = removal_depth = None
+    regions = []
+
+    for tag in tag_regex.finditer(document):
+        is_end, name, attribute_text = tag.group('end', 'name', 'attributes')
+        if name is None: continue   # Skipped region (ex. a comment)
+        name = name.lower()
+
+        if is_end:
+            # Close the most recent element with the same name, ignore the tag if there isn't one
+            if name not in open_tags: continue
+            depth = len(open_tags) - 1 - open_tags[::-1].index(name)
+            del open_tags[depth:]
+
+            # Removed div was closed, either by its own end tag or the end tag of an element it is within
+            if removal_start is not None and depth <= removal_depth:
+                regions.append((removal_start, tag.end() if depth == removal_depth else tag.start()))
+                removal_start = None
+            continue
+
+        if name == 'div':
+            attributes = parse_attributes(attribute_text)
+            is_quote = attributes.get('style') == quote_style
+            count += is_quote
+
+            if removal_start is None and (is_quote or attributes.get('align') == citation_align):
+                removal_start, removal_depth = tag.start(), len(open_tags)
+
+        if name in void_elements or attribute_text.endswith('/'):
+            # Element has no content, if it is a removed div only the tag itself is removed
+            if removal_start is not None and removal_depth == len(open_tags):
+                regions.append((removal_start, tag.end()))
+                removal_start = None
+        else:
+            open_tags.append(name)
+
+    if removal_start is not None:
+        regions.append((removal_start, len(document)))
+    if len(regions) == 0:
+        return count, document
 
-    count = len(quotes)
-    for quote in quotes:
-        quote.decompose()
-    for citation in quote_citation:
-        citation.decompose()
+    # Stitch together the content between removed regions
+    content, position = [], 0
+    for start, end in regions:
+        content.append(document[position:start])
+        position = end
+    content.append(document[position:])
 
-    return count, str(soup)
+    return count, ''.join(content)
@@ -0,0 +1,188 @@
+from re import compile
+from utilities.pre_processing.basic_statistics import count_emojis, count_apostrophe, count_tags, count_images, \
+    count_acronym, emoji_regex
+from utilities.pre_processing.alternates import count_handles, handle_regex
+from utilities.pre_processing.hashtags import split_hashtags, hashtag_regex, expand_hashtag
+from utilities.pre_processing.hyperlinks import pull_hyperlinks
+
+# Matches numbered back-references (ex. \1) while stepping over any other escape (ex. \\ or \w)
+backreference_regex = compile(r'\\(\d+)|\\\D')
+
+# Regex filters that can be merged into a single scan, filter -> (pattern, replacement)
+fusable_filters = {
+    count_emojis: (emoji_regex, ' '),
+    count_handles: (handle_regex, ' handle '),
+    split_hashtags: (hashtag_regex, expand_hashtag),
+}
+
+# Ordered filter pairs where running both as one alternation scan gives the same output as running them in sequence.
+# Holds when the patterns cannot match at the same position (or the first always wins there) and neither replacement
+# can create or break a match of the other.
+# NOTE: Only rarely matching filters are worth fusing, each match costs a Python call to count it, which is slower
+#  than separate scans for frequent matches (ex. count_express with count_apostrophe)
+fusion_compatible = {
+    (count_emojis, count_handles),
+    (count_emojis, split_hashtags),
+    (count_handles, split_hashtags),
+}
+
+# Text that must be in a document for a filter to match anything, filter -> (required text, value if absent)
+filter_triggers = {
+    pull_hyperlinks: ('http', ''),
+    count_tags: ('<', 0),
+    count_images: ('Image:', 0),
+    count_emojis: ('&#', 0),
+    count_handles: ('@', 0),
+    split_hashtags: ('#', 0),
+    count_acronym: ('.', 0),
+    count_apostrophe: ('\'', 0),
+}
+
+
+def offset_backreferences(pattern, offset):
+    """ Shifts the numbered back-references in a regex pattern by a fixed number of groups """
+    def replace(match):
+        if match.group(1) is None:
+            return match.group(0)
+        return '\\' + str(int(match.group(1)) + offset)
+
+    return backreference_regex.sub(replace, pattern)
+
+
+def fuse_patterns(patterns):
+    """ Combines regex patterns into a single alternation with a named group for each pattern """
+    alternatives, num_groups = [], 0
+    for index, pattern in enumerate(patterns):
+        # Account for the wrapping group as well as the groups of the preceding patterns
+        source = offset_backreferences(pattern.pattern, num_groups + 1)
+        alternatives.append('(?P<f%d>%s)' % (index, source))
+        num_groups += pattern.groups + 1
+
+    return compile('|'.join(alternatives))
+
+
+class FilterStage:
+    """ Single filter, skipped when its trigger text is not in the document """
+    def __init__(self, process):
+        self.process = process
+        self.trigger, self.empty_value = filter_triggers.get(process, (None, None))
+
+    def __call__(self, document, values):
+        if self.trigger is not None and self.trigger not in document:
+            value = self.empty_value
+        else:
+            value, document = self.process(document)
+
+        if value is not None:
+            values.append(value)
+        return document
+
+
+class FusedStage:
+    """ Sequence of compatible regex filters applied with a single alternation scan """
+    def __init__(self, processes):
+        self.patterns = [fusable_filters[process][0] for process in processes]
+        self.replacements = [fusable_filters[process][1] for process in processes]
+
+        triggers = [filter_triggers.get(process, (None, None))[0] for process in processes]
+        self.triggers = triggers if None not in triggers else None
+        self.fused_pattern = fuse_patterns(self.patterns)
+        self.group_map = {
+            self.fused_pattern.groupindex['f%d' % index]: index for index in range(len(self.patterns))
+        }
+
+    def __call__(self, document, values):
+        counts = [0] * len(self.patterns)
+
+        if self.triggers is None or any(trigger in document for trigger in self.triggers):
+            def replace(match):
+                index = self.group_map[match.lastindex]
+                counts[index] += 1
+
+                replacement = self.replacements[index]
+                if isinstance(replacement, str):
+                    return replacement
+                # Re-match with the original pattern so the replacement sees its own group numbering
+                return replacement(self.patterns[index].match(match.string, match.start()))
+
+            document = self.fused_pattern.sub(replace, document)
+
+        values += counts
+        return document
+
+
+def compile_stages(processes):
+    """ Groups a list of filters into stages, fusing runs of compatible regex filters """
+    stages, index = [], 0
+    while index < len(processes):
+        group = [processes[index]]
+
+        # Extend the group while the next filter is compatible with every filter already in it
+        while index + len(group) < len(processes):
+            candidate = processes[index + len(group)]
+            if not all((member, candidate) in fusion_compatible for member in group):
+                break
+            group.append(candidate)
+
+        stages.append(FusedStage(group) if len(group) > 1 else FilterStage(group[0]))
+        index += len(group)
+
+    return stages
+
+
+class FilterPipeline:
+    """ Compiled list of pre-processing filters, produces the same values and content as applying them in order """
+    def __init__(self, processes):
+        self.processes = list(processes)
+        self.stages = compile_stages(self.processes)
+
+    def __reduce__(self):
+        # Only send the filter list to worker processes, stages are re-compiled on arrival
+        return FilterPipeline, (self.processes,)
+
+    def __call__(self, document):
+        """
+        Applies the filters to a document
+
+        :param str document: Document content
+        :return tuple[list,str]: List of filter values (excluding None valued filters) and modified content
+        """
+        values = []
+        for stage in self.stages:
+            document = stage(document if isinstance(document, str) else '', values)
+
+        return values, document
+
+
+class BranchingPipeline:
+    """ Several filter lists that share a common prefix, the prefix is only applied once per document """
+    def __init__(self, branches):
+        self.branches = [list(branch) for branch in branches]
+
+        # Find the number of leading filters shared by every branch
+        prefix_length = 0
+        while all(len(branch) > prefix_length for branch in self.branches) and \
+                all(branch[prefix_length] is self.branches[0][prefix_length] for branch in self.branches):
+            prefix_length += 1
+
+        self.prefix = FilterPipeline(self.branches[0][:prefix_length])
+        self.suffixes = [FilterPipeline(branch[prefix_length:]) for branch in self.branches]
+
+    def __reduce__(self):
+        return BranchingPipeline, (self.branches,)
+
+    def __call__(self, document):
+        """
+        Applies the filters of every branch to a document
+
+        :param str document: Document content
+        :return list[tuple[list,str]]: Filter values and modified content for each branch
+        """
+        prefix_values, document = self.prefix(document)
+
+        outputs = []
+        for suffix in self.suffixes:
+            values, content = suffix(document)
+            outputs.append((prefix_values + values, content))
+
+        return outputs
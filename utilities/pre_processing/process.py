@@ -1,6 +1,8 @@
 from multiprocessing import Pool
 from pandas import DataFrame, read_csv
 from functools import partial
+from utilities.pre_processing.pipeline import FilterPipeline, BranchingPipeline
+from utilities.data_management.checkpoints import ShardCheckpoint, read_csv_chunks
 from config import n_threads
 
 
@@ -8,23 +10,19 @@ def apply_process(packed_data, processes, get_content, save_content):
     """
     Applies the pre-processing filters to a document
     :param packed_data: a tuple of document index, document
-    :param processes: list of processes to be applied
+    :param BranchingPipeline processes: compiled pipeline of processes to be applied, one branch per destination
     :param get_content: function that acts as an accessor for the dataset
     :param save_content: function that acts a mutator (ish..) for the dataset
-    :return: list of pre-processing values and
+    :return: list of modified documents, one for each branch of the pipeline
     """
     index, document = packed_data
 
-    values = [index]
     content = get_content(document)
 
-    for process in processes:   # For each pre-processing step to be applied
-        value, content = process(content if isinstance(content, str) else '')
-
-        if value is not None:
-            values.append(value)
-
-    return save_content(content, values, document)
+    return [
+        save_content(branch_content, [index] + values, document)
+        for values, branch_content in processes(content)
+    ]
 
 
 def process_documents(source_filename, dest_filename, processes, get_content, save_content, save_header, options):
@@ -41,19 +39,130 @@ def process_documents(source_filename, dest_filename, processes, get_content, sa
     :param options: Accepts options for document including
         delimiter of the source file, (default ',')
         max_documents to be pre-processed, (default is entire file)
+        chunk_size, number of rows to read at a time, if given the file is streamed in chunks (default None)
+        worker_chunk_size, number of rows sent to a worker at a time when streaming, (default 100)
+        resumable, whether a streamed run is checkpointed so it can be resumed, (default False)
+    """
+    process_branched_documents(source_filename, [dest_filename], [processes], get_content, save_content,
+                               [save_header], options)
+
+
+def process_branched_documents(source_filename, dest_filenames, branches, get_content, save_content, save_headers,
+                               options):
+    """
+    Pre-processes all documents within a CSV file with several lists of filters, writing a file for each.
+    Filters at the start of the lists that are shared by every list are only applied once per document.
+
+    :param source_filename: Filename for the source CSV file
+    :param dest_filenames: List of destination filenames, one for each list of filters
+    :param branches: List of lists of pre-processing functions (see process_documents)
+    :param get_content: Accessor for source file, (document) -> (document_content)
+    :param save_content: Mutator for destination file (row) (modified_content, values, document) -> (modified_document)
+    :param save_headers: List of headers, one for each destination file
+    :param options: Same as process_documents
     """
+    if not len(dest_filenames) == len(branches) == len(save_headers):
+        raise ValueError('Must provide a destination file and header for each list of filters')
+
     max_documents = options['max_documents'] if 'max_documents' in options else None
     encoding = options['encoding'] if 'encoding' in options else None
+    chunk_size = options['chunk_size'] if 'chunk_size' in options else None
+
+    pipeline = BranchingPipeline(branches)
+    processor = partial(apply_process, processes=pipeline, get_content=get_content, save_content=save_content)
+
+    if chunk_size is not None:
+        stream_documents(source_filename, dest_filenames, processor, save_headers, options)
+        return
 
     dataset = read_csv(source_filename, encoding=encoding, index_col=0, nrows=max_documents).values
 
     workers = Pool(n_threads)
-    processed_data = workers.map(
-        partial(apply_process, processes=processes, get_content=get_content, save_content=save_content),
-        enumerate(dataset)
-    )
+    processed_data = workers.map(processor, enumerate(dataset))
+    workers.close()
+    workers.join()
+
+    for branch_index, (dest_filename, save_header) in enumerate(zip(dest_filenames, save_headers)):
+        branch_data = DataFrame([rows[branch_index] for rows in processed_data], columns=save_header)
+        branch_data.to_csv(dest_filename, index=False)
+
+
+def stream_documents(source_filename, dest_filenames, processor, save_headers, options):
+    """
+    Pre-processes a CSV file in chunks, appending each processed chunk to the destinations as it completes.
+    At most two chunks are held in memory at once (one being written while the next is processed).
+    If resumable, each chunk is written as a numbered shard (see ShardCheckpoint) and a re-run continues from the last
+    shard complete for every destination, the destination files are only written once all chunks are done.
+
+    :param source_filename: Filename for the source CSV file
+    :param dest_filenames: List of destination filenames
+    :param processor: Function applied to each (index, document) pair, returns a row for each destination
+    :param save_headers: List of headers, one for each destination file
+    :param options: Same as process_documents, with chunk_size set
+    """
+    max_documents = options['max_documents'] if 'max_documents' in options else None
+    encoding = options['encoding'] if 'encoding' in options else None
+    chunk_size = options['chunk_size']
+    worker_chunk_size = options['worker_chunk_size'] if 'worker_chunk_size' in options else 100
+    resumable = options['resumable'] if 'resumable' in options else False
+
+    if type(chunk_size) is not int or chunk_size < 1:
+        raise ValueError('chunk_size provided is invalid, give int in range [1, inf]')
+
+    checkpoints = dest_files = None
+    if resumable:
+        checkpoints = [ShardCheckpoint(dest_filename, source_filename) for dest_filename in dest_filenames]
+
+        # Only resume from shards that are complete for every destination
+        num_shards = min(checkpoint.load_shards() for checkpoint in checkpoints)
+        start, offset = [checkpoint.truncate(num_shards) for checkpoint in checkpoints][0]
+
+        for checkpoint, save_header in zip(checkpoints, save_headers):
+            DataFrame(columns=save_header).to_csv(checkpoint.header_path, index=False)
+    else:
+        start, offset = None, 0
+        dest_files = [open(dest_filename, 'w', newline='') for dest_filename in dest_filenames]
+
+        for dest_file, save_header in zip(dest_files, save_headers):
+            DataFrame(columns=save_header).to_csv(dest_file, index=False)     # Write header
+
+    if max_documents is not None:
+        max_documents -= offset
+    chunks = read_csv_chunks(source_filename, chunk_size, encoding, start, max_documents)
+
+    def write_chunk(processed_chunk, chunk_start, chunk_end):
+        processed_chunk = list(processed_chunk)
+
+        for branch_index, save_header in enumerate(save_headers):
+            branch_chunk = DataFrame([rows[branch_index] for rows in processed_chunk], columns=save_header)
+
+            if checkpoints is None:
+                branch_chunk.to_csv(dest_files[branch_index], header=False, index=False)
+            else:
+                checkpoint = checkpoints[branch_index]
+                branch_chunk.to_csv(checkpoint.shard_path(), header=False, index=False)
+                checkpoint.add_shard(chunk_start, chunk_end, branch_chunk.shape[0])
+
+    workers = Pool(n_threads)
+    pending = None
+    for chunk, chunk_start, chunk_end in chunks:
+        # Queue the next chunk before writing the previous one so workers are not idle while writing
+        processed_chunk = workers.imap(processor, enumerate(chunk.values, start=offset), chunksize=worker_chunk_size)
+        offset += chunk.shape[0]
+
+        if pending is not None:
+            write_chunk(*pending)
+        pending = processed_chunk, chunk_start, chunk_end
+
+    if pending is not None:
+        write_chunk(*pending)
+
     workers.close()
     workers.join()
 
-    processed_data = DataFrame(processed_data, columns=save_header)
-    processed_data.to_csv(dest_filename, index=False)
+    if checkpoints is None:
+        for dest_file in dest_files:
+            dest_file.close()
+    else:
+        for checkpoint in checkpoints:
+            checkpoint.finalize()
@@ -1,5 +1,9 @@
 from re import compile
-from numpy import zeros
+from numpy import zeros, array, asarray, repeat, arange, bincount, cumsum, fromiter, iinfo, int8, int16, int32, int64, \
+    savez, load
+from pandas import Index
+from itertools import chain
+from utilities.data_management.io import make_path
 import config
 
 # Run clean on contexts
@@ -59,28 +63,115 @@ def runtime_clean(documents):
     return documents
 
 
+def index_dtype(num_tokens):
+    """ Smallest signed integer type that can hold every index of a vocabulary """
+    for dtype in (int8, int16, int32):
+        if num_tokens - 1 <= iinfo(dtype).max:
+            return dtype
+    return int64
+
+
+class VocabularyIndex:
+    """
+    Maps embedding tokens to their index within the word embeddings.
+    Tokens are kept in a hashed pandas index, so a batch of documents is looked up in a single vectorized pass.
+    """
+    def __init__(self, tokens, indexes, num_tokens):
+        self.tokens = Index(tokens, dtype=object)
+        self.indexes = indexes
+        self.num_tokens = num_tokens
+        self.dtype = index_dtype(num_tokens)
+
+    @classmethod
+    def from_tokens(cls, embedding_tokens):
+        """ Builds the index from the list of embedding tokens (where a token is repeated, its last index is kept) """
+        tokens = Index(asarray(embedding_tokens, dtype=object))
+        is_last = ~tokens.duplicated(keep='last')
+
+        return cls(tokens[is_last], arange(len(tokens), dtype=index_dtype(len(tokens)))[is_last], len(tokens))
+
+    @classmethod
+    def load(cls, path):
+        """ Loads an index saved with save """
+        with load(make_path(path), allow_pickle=True) as saved:
+            return cls(saved['tokens'], saved['indexes'], int(saved['num_tokens']))
+
+    def save(self, path):
+        """
+        Saves the index (NOTE: numpy appends .npz to the path if it has a different suffix)
+        Tokens are saved as an object array, a fixed width string array would pad every token to the longest
+        """
+        tokens = asarray(self.tokens.values, dtype=object)
+        savez(make_path(path), tokens=tokens, indexes=self.indexes, num_tokens=self.num_tokens)
+
+    def __len__(self):
+        return self.num_tokens
+
+    @property
+    def mapping(self):
+        """ Dictionary of token -> index """
+        return dict(zip(self.tokens, self.indexes.tolist()))
+
+    def lookup(self, tokens):
+        """
+        Finds the index of each token
+
+        :param tokens: Array of tokens
+        :return tuple: Whether each token is in the vocabulary, and the index of each token (undefined where missing)
+        """
+        positions = self.tokens.get_indexer(tokens)
+        return positions >= 0, self.indexes[positions]
+
+    def encode(self, documents, max_tokens=None, keep_null=False):
+        """
+        Replaces the tokens of each document with their index, documents are truncated to max_tokens indexes.
+        NOTE: Matches the original token_to_index, only the first max_tokens + 1 tokens of a document are looked up
+
+        :param documents: List of documents
+        :param int max_tokens: Maximum number of indexes per document, (default config.max_tokens)
+        :param bool keep_null: Whether null strings are looked up like any other token, rather than dropped
+        :return: Matrix of token indexes (num documents x max tokens), padded with zeros
+        """
+        max_tokens = config.max_tokens if max_tokens is None else max_tokens
+        doc_arrays = zeros((len(documents), max_tokens), dtype=self.dtype)
+
+        split_documents = [
+            document.split(' ')[:max_tokens + 1] if isinstance(document, str) else []
+            for document in documents
+        ]
+        tokens = array(list(chain.from_iterable(split_documents)), dtype=object)
+        if len(tokens) == 0 or self.num_tokens == 0:
+            return doc_arrays
+
+        # Look up every token of the batch at once, dropping null strings and tokens without embeddings
+        found, indexes = self.lookup(tokens)
+        if not keep_null:
+            found &= tokens != ''
+        lengths = fromiter(map(len, split_documents), dtype=int64, count=len(split_documents))
+        doc_indexes = repeat(arange(len(documents)), lengths)[found]
+        indexes = indexes[found]
+
+        # Column of each index is its position among the found tokens of its document
+        counts = bincount(doc_indexes, minlength=len(documents))
+        columns = arange(len(doc_indexes)) - (cumsum(counts) - counts)[doc_indexes]
+        in_bounds = columns < max_tokens
+
+        doc_arrays[doc_indexes[in_bounds], columns[in_bounds]] = indexes[in_bounds]
+        return doc_arrays
+
+
 def token_to_index(raw_documents, embedding_tokens, return_mapping=False):
-    """ Takes documents and replaces their tokens with the index within the word embeddings """
-    # Enumerate embedding tokens
-    token_mapping = {token: index for index, token in enumerate(embedding_tokens)}
-    max_tokens = config.max_tokens
-
-    # Convert documents to arrays of token indexes
-    doc_arrays = zeros((len(raw_documents), max_tokens), dtype=int)    # Allocate matrix
-    for index, document in enumerate(raw_documents):
-        if not isinstance(document, str): continue
-
-        indexed_document = []                                           # Temp list of enumerated indexes
-        for token_index, token in enumerate(document.split(' ')):       # Split document into tokens
-            if token_index > max_tokens: break                          # Don't translate past max document length
-            if len(token) == 0: continue                                # Don't convert null strings
-            elif token in token_mapping:                                       # Add token index to temp list
-                indexed_document.append(token_mapping[token])
-
-        # Push indexes to matrix
-        num_tokens = min([max_tokens, len(indexed_document)])
-        doc_arrays[index, :num_tokens] = indexed_document[:num_tokens]
+    """
+    Takes documents and replaces their tokens with the index within the word embeddings
+
+    :param raw_documents: List of documents
+    :param embedding_tokens: Embedding tokens or a pre-built VocabularyIndex
+    :param bool return_mapping: Whether to also return the token -> index mapping, (default False)
+    """
+    vocabulary = embedding_tokens if isinstance(embedding_tokens, VocabularyIndex) \
+        else VocabularyIndex.from_tokens(embedding_tokens)
+    doc_arrays = vocabulary.encode(raw_documents)
 
     if return_mapping:
-        return doc_arrays, token_mapping
+        return doc_arrays, vocabulary.mapping
     return doc_arrays